@@ -0,0 +1,234 @@
+"""
+Сквозной бенчмарк: нажатие кнопки -> доставка по вебсокету.
+
+Фронты подаются симулированным бэкендом GPIO через настоящую
+таблицу команд, клиенты подключаются к настоящему register.
+Результат печатается в JSON, чтобы сравнивать релизы.
+
+Запуск: python bench.py --clients 10 --cycles 200 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+
+os.environ.setdefault("RPI_GPIO_BACKEND", "sim")
+
+import websockets  # noqa: E402
+
+import db  # noqa: E402
+import hal  # noqa: E402
+import gpio  # noqa: E402
+from bridge import bridge  # noqa: E402
+from logger import log  # noqa: E402
+from scenario import machine, ARMED  # noqa: E402
+
+
+# кнопки одного полного сценария и команды, которые они рассылают
+CYCLE = (
+    (gpio.READY, "ready pressed"),
+    (gpio.ACCEPT, "accept pressed"),
+    (gpio.START, "start pressed"),
+    (gpio.CANCEL, "cancel pressed"),
+)
+
+
+def percentile(values: list, q: float) -> float:
+    """Метод возвращающий перцентиль q (0-100) отсортированного списка."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, round(q / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def summary(values: list) -> dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50) * 1000,
+        "p99": percentile(values, 99) * 1000,
+        "max": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+class Client:
+    """Клиент дашборда, запоминающий время получения сообщений."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.queue = asyncio.Queue()
+        self.received = 0
+        self.task = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        try:
+            async for message in self.websocket:
+                self.received += 1
+                await self.queue.put((time.perf_counter(), message))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def wait_for(self, message: str) -> float:
+        """Метод ожидающий сообщение и возвращающий время его получения."""
+        while True:
+            received, current = await self.queue.get()
+            if current == message:
+                return received
+
+    def drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+async def arm(client: Client):
+    """Метод запускающий сценарий командой 'ready' с вебсокета."""
+    await client.websocket.send("ready")
+    while machine.state != ARMED:
+        await asyncio.sleep(0)
+
+
+async def measure_latency(
+    loop, sim, clients: list, cycles: int, bounces: int
+) -> dict:
+    """Последовательные нажатия: задержка до доставки каждому клиенту."""
+    latencies = []
+    for _ in range(cycles):
+        await arm(clients[0])
+        for pin, command in CYCLE:
+            started = time.perf_counter()
+            await loop.run_in_executor(None, sim.press, pin, bounces)
+            for client in clients:
+                latencies.append(await client.wait_for(command) - started)
+    return summary(latencies)
+
+
+async def measure_throughput(
+    loop, sim, clients: list, duration: float, bounces: int
+):
+    """Нажатия без пауз в течение duration сек из потока GPIO."""
+
+    def press_cycle():
+        bridge.submit(machine.fire, "ready")
+        for pin, _ in CYCLE:
+            sim.press(pin, bounces)
+
+    for client in clients:
+        client.drain()
+    handled = bridge.handled
+    received = sum(client.received for client in clients)
+    presses = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        await loop.run_in_executor(None, press_cycle)
+        presses += len(CYCLE)
+    await bridge.queue.join()
+    elapsed = time.perf_counter() - started
+    delivered = None
+    while delivered != sum(client.received for client in clients):
+        delivered = sum(client.received for client in clients)
+        await asyncio.sleep(0.1)
+    return {
+        "presses": presses,
+        "seconds": elapsed,
+        "presses_per_sec": presses / elapsed,
+        "events_per_sec": (bridge.handled - handled) / elapsed,
+        "messages_delivered": delivered - received,
+    }
+
+
+def measure_db() -> dict:
+    """Время сохранения накопленных записей журнала."""
+    started = time.perf_counter()
+    db.logs_writer.flush()
+    stats = db.logs_writer.stats()
+    return {
+        "rows": db.Logs.select().count(),
+        "flush_wait_seconds": time.perf_counter() - started,
+        "save_ms_per_row": (
+            stats["save_seconds"] / stats["saved"] * 1000
+            if stats["saved"]
+            else 0.0
+        ),
+        "batch_max_ms": stats["batch_max_seconds"] * 1000,
+    }
+
+
+async def run(args) -> dict:
+    loop = asyncio.get_running_loop()
+    bridge.attach(loop)
+    bridge_task = asyncio.create_task(bridge.run())
+    gpio.setup_rpi_handlers()
+    gpio.recover(db.logs_tail(machine.boundaries()))
+    sim = hal.get_backend()
+    async with websockets.serve(gpio.register, "localhost", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        clients = [
+            Client(await websockets.connect(f"ws://localhost:{port}"))
+            for _ in range(args.clients)
+        ]
+        latency = await measure_latency(
+            loop, sim, clients, args.cycles, args.bounces
+        )
+        persist = measure_db()
+        throughput = await measure_throughput(
+            loop, sim, clients, args.duration, args.bounces
+        )
+        for client in clients:
+            await client.websocket.close()
+            client.task.cancel()
+    bridge_task.cancel()
+    return {
+        "timestamp": time.time(),
+        "backend": sim.name,
+        "clients": args.clients,
+        "cycles": args.cycles,
+        "bounces": args.bounces,
+        "latency_ms": latency,
+        "db": persist,
+        "throughput": throughput,
+        "bridge": bridge.stats(),
+        "debounce": {
+            pin: debouncer.stats()
+            for pin, debouncer in gpio.DEBOUNCERS.items()
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--cycles", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument(
+        "--bounces", type=int, default=3, help="ложных фронтов на нажатие"
+    )
+    parser.add_argument("--output", help="файл для результата в JSON")
+    args = parser.parse_args(argv)
+
+    log.setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        db.database.init(
+            os.path.join(directory, "bench.db"), pragmas=db.database._pragmas
+        )
+        db.init_db(db.database, [db.Logs, db.LogsHourly])
+        db.logs_writer.start()
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            db.logs_writer.stop()
+            db.database.close()
+
+    report = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report)
+    print(report)
+    return result
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
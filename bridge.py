@@ -0,0 +1,116 @@
+import time
+import asyncio
+import threading
+from functools import wraps
+from typing import Callable
+
+import metrics
+from logger import get_logger
+
+
+log = get_logger("bridge")
+
+
+# максимальное число необработанных событий в очереди
+EVENTS_QUEUE_SIZE = 256
+
+
+class EventBridge:
+    """
+    Мост событий из потоков GPIO и таймеров в цикл событий.
+
+    События попадают в ограниченную очередь через call_soon_threadsafe
+    и обрабатываются одной задачей-потребителем в потоке цикла,
+    поэтому CONNECTIONS и рассылка трогаются только из него.
+    """
+
+    def __init__(self, maxsize: int = EVENTS_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.loop = None
+        self.queue = None
+        self.dropped = 0
+        self.max_depth = 0
+        self.handled = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Метод привязывающий мост к циклу событий."""
+        self.loop = loop
+        self.queue = asyncio.Queue(self.maxsize)
+        return self
+
+    def submit(self, handler: Callable, *args):
+        """Метод передающий событие в цикл событий из любого потока."""
+        if self.loop is None:
+            return handler(*args)
+        self.loop.call_soon_threadsafe(
+            self._put, (time.perf_counter(), handler, args)
+        )
+
+    def call_later(self, delay: float, handler: Callable, *args):
+        """Метод планирующий вызов в цикле событий из любого потока."""
+        if self.loop is None:
+            timer = threading.Timer(delay, handler, args=args)
+            timer.daemon = True
+            return timer.start()
+        self.loop.call_soon_threadsafe(
+            self.loop.call_later, delay, handler, *args
+        )
+
+    def wrap(self, handler: Callable) -> Callable:
+        """Метод оборачивающий обработчик для вызова из потока GPIO."""
+
+        @wraps(handler)
+        def callback(*args):
+            return self.submit(handler, *args)
+
+        return callback
+
+    def _put(self, item: tuple):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            metrics.EVENTS_DROPPED.inc()
+            log.error(f"Events queue is full, event dropped ({self.dropped})")
+            return
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    async def run(self):
+        """Задача-потребитель событий."""
+        while True:
+            created, handler, args = await self.queue.get()
+            try:
+                handler(*args)
+            except Exception as e:
+                log.error(str(e))
+            finally:
+                latency = time.perf_counter() - created
+                self.handled += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                metrics.EVENT_LATENCY.observe(latency)
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        """Метод возвращающий глубину очереди и задержку обработки."""
+        return {
+            "depth": self.queue.qsize() if self.queue else 0,
+            "max_depth": self.max_depth,
+            "dropped": self.dropped,
+            "handled": self.handled,
+            "latency_avg": (
+                self.latency_total / self.handled if self.handled else 0.0
+            ),
+            "latency_max": self.latency_max,
+        }
+
+
+bridge = EventBridge()
+
+metrics.registry.gauge(
+    "rpi_events_queue_depth",
+    "Необработанные события GPIO в очереди",
+    lambda: bridge.queue.qsize() if bridge.queue else 0,
+)
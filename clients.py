@@ -0,0 +1,196 @@
+import asyncio
+from collections import deque
+from typing import Callable
+
+import websockets
+
+import metrics
+from logger import get_logger
+
+
+log = get_logger("clients")
+
+# политики переполнения исходящей очереди клиента
+DROP_OLDEST, COALESCE, DISCONNECT = "drop_oldest", "coalesce", "disconnect"
+
+# виды сообщений: события, снимки/изменения состояния панели
+# и пачка сообщений, которая занимает в очереди одно место
+EVENT, STATE, BATCH = "event", "state", "batch"
+
+# размер исходящей очереди клиента и политика по умолчанию
+CLIENT_QUEUE_SIZE = 64
+CLIENT_POLICY = COALESCE
+
+
+class Client:
+    """
+    Исходящая очередь одного подключения.
+
+    Сообщения отправляет отдельная задача с ожиданием сброса буфера,
+    поэтому медленный клиент копит не больше maxsize сообщений
+    и не задерживает остальных.
+    """
+
+    def __init__(
+        self,
+        websocket: websockets,
+        resync: Callable = None,
+        maxsize: int = CLIENT_QUEUE_SIZE,
+        policy: str = CLIENT_POLICY,
+    ):
+        self.websocket = websocket
+        self.resync = resync
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.stale = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.closing = None
+        self.task = asyncio.create_task(self.run())
+
+    def put(self, message, kind: str = EVENT):
+        """Метод ставящий сообщение в очередь с учетом политики."""
+        if self.task.done():
+            return
+        if len(self.queue) >= self.maxsize and not self._overflow():
+            return
+        self.queue.append((kind, message))
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self.ready.set()
+
+    def _overflow(self) -> bool:
+        """
+        Метод освобождающий место в очереди.
+
+        Возвращает False, если новое сообщение ставить не нужно.
+        """
+        if self.policy == DISCONNECT:
+            log.info(f"Slow client {self.address} disconnected")
+            metrics.CLIENT_DROPPED.inc(DISCONNECT)
+            self.queue.clear()
+            self.task.cancel()
+            # ссылка на задачу держится, пока закрытие не завершится
+            self.closing = asyncio.create_task(
+                self.websocket.close(1013, "slow consumer")
+            )
+            return False
+        if self.policy == COALESCE:
+            # изменения состояния заменяются снимком после опустошения
+            # очереди, поэтому их можно выбросить все разом
+            events = deque(item for item in self.queue if item[0] != STATE)
+            removed = len(self.queue) - len(events)
+            if removed:
+                self.queue = events
+                self.coalesced += removed
+                self.stale = True
+                metrics.CLIENT_DROPPED.inc(COALESCE, amount=removed)
+                return True
+        self.queue.popleft()
+        self.dropped += 1
+        metrics.CLIENT_DROPPED.inc(DROP_OLDEST)
+        return True
+
+    async def run(self):
+        """Задача отправки сообщений клиенту."""
+        try:
+            while True:
+                await self.ready.wait()
+                while self.queue:
+                    kind, message = self.queue.popleft()
+                    # пачка отправляется по одному сообщению с ожиданием
+                    # сброса буфера, поэтому ее размер не ограничен очередью
+                    for part in message if kind == BATCH else (message,):
+                        await self.websocket.send(part)
+                        self.sent += 1
+                self.ready.clear()
+                self.idle.set()
+                if self.stale and self.resync is not None:
+                    self.stale = False
+                    self.resync(self.websocket)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.idle.set()
+
+    async def put_when_idle(self, message, kind: str = EVENT) -> bool:
+        """
+        Метод ставящий сообщение после отправки всей очереди.
+
+        Для длинных выгрузок: следующая часть ждет, пока клиент
+        примет предыдущие. Возвращает False, если клиент отключен.
+        """
+        while self.queue and not self.task.done():
+            self.idle.clear()
+            await self.idle.wait()
+        if self.task.done():
+            return False
+        self.put(message, kind)
+        return True
+
+    def close(self):
+        self.task.cancel()
+        self.idle.set()
+
+    @property
+    def address(self) -> str:
+        address = getattr(self.websocket, "remote_address", None)
+        return ":".join(map(str, address)) if address else "?"
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self.queue),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+class Clients:
+    """Реестр исходящих очередей подключений."""
+
+    def __init__(self):
+        self.clients = {}
+
+    def add(self, websocket: websockets, resync: Callable = None) -> Client:
+        client = self.clients[websocket] = Client(websocket, resync)
+        return client
+
+    def remove(self, websocket: websockets):
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            client.close()
+
+    def send(self, connections, message, kind: str = EVENT):
+        """Метод ставящий одно и то же сообщение в очереди подключений."""
+        for websocket in connections:
+            client = self.clients.get(websocket)
+            if client is not None:
+                client.put(message, kind)
+
+    async def send_when_idle(self, websocket: websockets, message) -> bool:
+        """Метод ставящий сообщение клиенту после отправки его очереди."""
+        client = self.clients.get(websocket)
+        return client is not None and await client.put_when_idle(message)
+
+    def stats(self) -> dict:
+        """Метод возвращающий статистику очередей по адресам клиентов."""
+        return {
+            client.address: client.stats() for client in self.clients.values()
+        }
+
+
+clients = Clients()
+
+metrics.registry.gauge(
+    "rpi_ws_client_queue_max",
+    "Наибольшая текущая исходящая очередь клиента",
+    lambda: max(
+        (len(client.queue) for client in clients.clients.values()), default=0
+    ),
+)
@@ -0,0 +1,181 @@
+import os
+
+try:
+    import tomllib
+except ImportError:  # python < 3.11
+    import tomli as tomllib
+
+import exceptions
+import protocol
+from logger import get_logger
+from scenario import (
+    ANY_STATE,
+    TRANSITIONS,
+    IDLE,
+    ARMED,
+    READY,
+    ACCEPTED,
+    STARTED,
+)
+
+
+log = get_logger("config")
+
+
+# путь к файлу настроек панели
+CONFIG_ENV = "RPI_CONFIG"
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "panel.toml")
+
+STATES = (IDLE, ARMED, READY, ACCEPTED, STARTED)
+# обозначение любого состояния в таблице переходов файла
+ANY = "*"
+
+# кнопки и команды, которые они вызывают: "<кнопка> pressed"
+BUTTONS = {
+    command.partition(" ")[0]: command
+    for command, code in protocol.COMMAND_CODES.items()
+    if code <= protocol.BUTTONS_COUNT
+}
+LEDS = ("ready", "accept", "start", "cancel")
+
+DEFAULTS = {
+    "buttons": {
+        "wave": 4,
+        "sim": 17,
+        "ready": 27,
+        "accept": 22,
+        "start": 23,
+        "cancel": 24,
+    },
+    "leds": {"ready": 16, "accept": 13, "start": 19, "cancel": 25},
+    "timings": {
+        "cancel_delay": 15.0,
+        "stable_time": 0.04,
+        "long_press_time": 1.0,
+        "blink_period": 0.75,
+        "duty_cycle": 0.5,
+    },
+    "transitions": [
+        {"from": state or ANY, "event": event, "to": target}
+        for (state, event), target in TRANSITIONS.items()
+    ],
+}
+
+
+class PanelConfig:
+    """
+    Скомпилированные настройки панели.
+
+    Проверяются и переводятся в словари один раз при загрузке,
+    обработчики читают готовые значения без разбора файла.
+    """
+
+    def __init__(self, data: dict, path: str = None):
+        self.path = path
+        buttons = self._section(data, "buttons", dict)
+        leds = self._section(data, "leds", dict)
+        timings = self._section(data, "timings", dict)
+        self.buttons = self._pins(buttons, BUTTONS, "button")
+        self.leds = self._pins(leds, LEDS, "led")
+        used = [*self.buttons.values(), *self.leds.values()]
+        if len(set(used)) != len(used):
+            raise exceptions.ConfigError("Pins must not repeat")
+        for key, value in timings.items():
+            if key not in DEFAULTS["timings"]:
+                raise exceptions.ConfigError(f"Unknown timing {key}")
+            if (
+                isinstance(value, bool)
+                or not isinstance(value, (int, float))
+                or value <= 0
+            ):
+                raise exceptions.ConfigError(f"{key} must be positive")
+            setattr(self, key, float(value))
+        if self.duty_cycle >= 1:
+            raise exceptions.ConfigError("duty_cycle must be below 1")
+        self.transitions = self._transitions(
+            self._section(data, "transitions", list)
+        )
+
+    @staticmethod
+    def _section(data: dict, name: str, kind: type):
+        """
+        Метод возвращающий раздел файла поверх значений по умолчанию.
+
+        Таблицы дополняют значения по умолчанию, списки их заменяют.
+        """
+        section = data.get(name, DEFAULTS[name])
+        if not isinstance(section, kind):
+            raise exceptions.ConfigError(f"Section {name} has wrong type")
+        if kind is dict:
+            return {**DEFAULTS[name], **section}
+        return section
+
+    @staticmethod
+    def _pins(pins: dict, names, kind: str) -> dict:
+        for name, pin in pins.items():
+            if name not in names:
+                raise exceptions.ConfigError(f"Unknown {kind} {name}")
+            # true и false в TOML - bool, подкласс int
+            if (
+                isinstance(pin, bool)
+                or not isinstance(pin, int)
+                or not 0 <= pin <= 27
+            ):
+                raise exceptions.ConfigError(f"Bad pin for {kind} {name}")
+        return dict(pins)
+
+    @staticmethod
+    def _transitions(rows: list) -> dict:
+        events = protocol.COMMAND_CODES
+        transitions = {}
+        for row in rows:
+            try:
+                state, event, target = row["from"], row["event"], row["to"]
+            except (KeyError, TypeError):
+                raise exceptions.ConfigError(f"Bad transition {row}")
+            if not all(isinstance(name, str) for name in row.values()):
+                raise exceptions.ConfigError(f"Bad transition {row}")
+            if state != ANY and state not in STATES or target not in STATES:
+                raise exceptions.ConfigError(f"Unknown state in {row}")
+            if event not in events:
+                raise exceptions.ConfigError(f"Unknown event in {row}")
+            transitions[(ANY_STATE if state == ANY else state, event)] = target
+        return transitions
+
+
+def load(path: str = None) -> PanelConfig:
+    """
+    Метод читающий и проверяющий файл настроек.
+
+    Без файла используются значения по умолчанию.
+    """
+    path = path or os.environ.get(CONFIG_ENV, CONFIG_PATH)
+    if not os.path.exists(path):
+        return PanelConfig({})
+    try:
+        with open(path, "rb") as file:
+            data = tomllib.load(file)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise exceptions.ConfigError(f"Cannot read {path}: {e}")
+    return PanelConfig(data, path)
+
+
+def reload() -> PanelConfig:
+    """
+    Метод перечитывающий файл настроек.
+
+    Новые настройки подменяют текущие одной операцией,
+    при ошибке остаются прежние. Возвращает новые настройки или None.
+    """
+    global current
+    try:
+        config = load(current.path)
+    except exceptions.ConfigError as e:
+        log.error(f"Config reload failed: {e}")
+        return None
+    current = config
+    log.info(f"Config reloaded from {config.path}")
+    return config
+
+
+current = load()
@@ -1,9 +1,49 @@
-from datetime import datetime
+import time
+import queue
+import threading
+from datetime import datetime, timedelta
+from typing import Callable
 
-from peewee import SqliteDatabase, DateTimeField, CharField, Model
+from peewee import (
+    EXCLUDED,
+    SqliteDatabase,
+    DateTimeField,
+    CharField,
+    IntegerField,
+    Model,
+    fn,
+)
 
+import metrics
+from logger import get_logger
 
-database = SqliteDatabase('rpi.db')
+
+log = get_logger('db')
+
+
+database = SqliteDatabase(
+    'rpi.db',
+    pragmas={
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'auto_vacuum': 'incremental',
+    },
+)
+
+# максимальный размер пачки записей и задержка ее сохранения, сек
+WRITER_BATCH_SIZE = 64
+WRITER_MAX_DELAY = 0.5
+
+# хранение подробного журнала: по возрасту (дни) и числу строк,
+# более старые записи сворачиваются в почасовые итоги
+RETENTION_DAYS = 30
+RETENTION_ROWS = 100_000
+# период сжатия журнала, сек
+COMPACTION_INTERVAL = 60 * 60
+# страниц, освобождаемых за одно сжатие
+VACUUM_PAGES = 1000
+# максимум записей хвоста журнала для восстановления после перезапуска
+REPLAY_LIMIT = 256
 
 
 class Logs(Model):
@@ -11,32 +51,269 @@ class Logs(Model):
     dt = DateTimeField(default=datetime.now)
     command = CharField()
 
-    @staticmethod
-    def get_last_elem(command: str = None):
-        """Метод возвращающий последний элемент."""
-        elem = Logs.select().order_by(Logs.id.desc())
-        if command:
-            elem = elem.where(Logs.command == command)
-        return elem.get()
-
-    @staticmethod
-    def check_last_elem_command(command: str):
-        """Метод проверяющий последнюю команду."""
-        return Logs.get_last_elem().command == command
-
-    @staticmethod
-    def check_button_was_pressed_less_than_15_sec(command: str):
-        """Метод проверяющий время нажатия последней команды"""
-        return (
-            datetime.now() - Logs.get_last_elem(command).dt
-        ).total_seconds() <= 15
+    class Meta:
+        database = database
+        indexes = ((('command', 'dt'), False),)
+
+
+class LogsHourly(Model):
+    """Модель почасовых итогов журнала после сжатия."""
+    hour = DateTimeField()
+    command = CharField()
+    count = IntegerField(default=0)
 
     class Meta:
         database = database
+        indexes = ((('hour', 'command'), True),)
+
+
+def _fold(query) -> int:
+    """Метод сворачивающий записи журнала в почасовые итоги и удаляющий их."""
+    hour = fn.strftime('%Y-%m-%d %H:00:00', Logs.dt)
+    totals = (
+        query.select(hour.alias('hour'), Logs.command, fn.COUNT(Logs.id))
+        .group_by(hour, Logs.command)
+        .tuples()
+    )
+    for hour_value, command, count in list(totals):
+        LogsHourly.insert(
+            hour=hour_value, command=command, count=count
+        ).on_conflict(
+            conflict_target=[LogsHourly.hour, LogsHourly.command],
+            update={LogsHourly.count: LogsHourly.count + EXCLUDED.count},
+        ).execute()
+    ids = query.select(Logs.id)
+    return Logs.delete().where(Logs.id.in_(ids)).execute()
+
+
+def compact_logs(
+    max_age: int = RETENTION_DAYS,
+    max_rows: int = RETENTION_ROWS,
+    vacuum_pages: int = VACUUM_PAGES,
+) -> int:
+    """
+    Метод ограничивающий журнал по возрасту и числу строк.
+
+    Вытесняемые записи сворачиваются в LogsHourly,
+    после чего освобождается часть страниц файла бд.
+    """
+    cutoff = datetime.now() - timedelta(days=max_age)
+    with database.atomic():
+        folded = _fold(Logs.select().where(Logs.dt < cutoff))
+        threshold = (
+            Logs.select(Logs.id)
+            .order_by(Logs.id.desc())
+            .offset(max_rows)
+            .limit(1)
+            .scalar()
+        )
+        if threshold is not None:
+            folded += _fold(Logs.select().where(Logs.id <= threshold))
+    # через execute_sql прагма выполняется на один шаг и освобождает
+    # одну страницу, executescript доводит ее до конца
+    database.connection().executescript(
+        f'PRAGMA incremental_vacuum({vacuum_pages});'
+    )
+    if folded:
+        log.info(f'Logs compacted: {folded} rows folded into LogsHourly')
+    return folded
+
+
+def logs_page(
+    after_id: int = 0,
+    start: datetime = None,
+    end: datetime = None,
+    command: str = None,
+    limit: int = 500,
+) -> list:
+    """
+    Метод возвращающий страницу журнала после записи after_id.
+
+    Пагинация по ключу Logs.id не зависит от глубины страницы.
+    Строки возвращаются кортежами (id, dt, command).
+    """
+    query = Logs.select(Logs.id, Logs.dt, Logs.command).where(
+        Logs.id > after_id
+    )
+    if start is not None:
+        query = query.where(Logs.dt >= start)
+    if end is not None:
+        query = query.where(Logs.dt < end)
+    if command:
+        query = query.where(Logs.command == command)
+    return list(query.order_by(Logs.id).limit(limit).tuples())
+
+
+def logs_tail(boundaries: tuple, limit: int = REPLAY_LIMIT) -> list:
+    """
+    Метод возвращающий записи журнала после последней границы сценария.
+
+    Граница ищется по индексу (command, dt) одной выборкой на команду,
+    хвост - диапазоном по Logs.id, поэтому время не зависит от размера
+    журнала. Если границ нет, возвращаются последние limit записей.
+    Строки возвращаются кортежами (id, dt, command).
+    """
+    boundary = max(
+        (
+            Logs.select(Logs.id)
+            .where(Logs.command == command)
+            .order_by(Logs.dt.desc())
+            .limit(1)
+            .scalar()
+            or 0
+            for command in boundaries
+        ),
+        default=0,
+    )
+    query = Logs.select(Logs.id, Logs.dt, Logs.command).where(
+        Logs.id > boundary
+    )
+    rows = list(query.order_by(Logs.id.desc()).limit(limit).tuples())
+    return rows[::-1]
+
+
+class LogsWriter:
+    """
+    Фоновый писатель журнала.
+
+    Записи ставятся в очередь из обработчиков кнопок и сохраняются
+    отдельным потоком пачками в одной транзакции.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        model,
+        batch_size: int = WRITER_BATCH_SIZE,
+        max_delay: float = WRITER_MAX_DELAY,
+        compact: Callable = None,
+        compact_interval: float = COMPACTION_INTERVAL,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.compact = compact
+        self.compact_interval = compact_interval
+        self.queue = queue.Queue()
+        self.saved = 0
+        self.save_seconds = 0.0
+        self.save_max = 0.0
+        self._thread = None
+
+    def start(self):
+        """Метод запускающий поток записи."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self.run, name='logs-writer', daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def put(self, elem):
+        """Метод ставящий запись в очередь на сохранение."""
+        self.queue.put(elem)
+        return elem
+
+    def flush(self):
+        """Метод дожидающийся сохранения всех записей из очереди."""
+        self.queue.join()
+
+    def stop(self, timeout: float = None):
+        """Метод сохраняющий оставшиеся записи и завершающий поток."""
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _collect(self, first) -> tuple[list, bool]:
+        """Метод набирающий пачку записей не дольше max_delay."""
+        batch, stop = [first], False
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                elem = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if elem is self._STOP:
+                self.queue.task_done()
+                stop = True
+                break
+            batch.append(elem)
+        return batch, stop
+
+    def _save(self, batch: list):
+        started = time.perf_counter()
+        try:
+            with self.model._meta.database.atomic():
+                for elem in batch:
+                    elem.save()
+            elapsed = time.perf_counter() - started
+            self.saved += len(batch)
+            self.save_seconds += elapsed
+            self.save_max = max(self.save_max, elapsed)
+            metrics.DB_BATCH_SECONDS.observe(elapsed)
+            metrics.DB_ROWS.inc(amount=len(batch))
+        except Exception as e:
+            log.error(f'Logs batch of {len(batch)} was not saved: {e}')
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        """Метод возвращающий число сохраненных записей и время сохранения."""
+        return {
+            "queued": self.queue.qsize(),
+            "saved": self.saved,
+            "save_seconds": self.save_seconds,
+            "batch_max_seconds": self.save_max,
+        }
+
+    def _compact(self):
+        try:
+            self.compact()
+        except Exception as e:
+            log.error(f'Logs compaction failed: {e}')
+
+    def run(self):
+        stop = False
+        next_compaction = time.monotonic()
+        while not stop:
+            timeout = None
+            if self.compact is not None:
+                if time.monotonic() >= next_compaction:
+                    self._compact()
+                    next_compaction = time.monotonic() + self.compact_interval
+                timeout = next_compaction - time.monotonic()
+            try:
+                first = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if first is self._STOP:
+                self.queue.task_done()
+                break
+            batch, stop = self._collect(first)
+            self._save(batch)
+
+
+logs_writer = LogsWriter(Logs, compact=compact_logs)
 
 
 def init_db(db: SqliteDatabase, tables: list):
-    """Метод инициализирующий бд."""
-    db.connect()
-    db.drop_tables(tables)
+    """
+    Метод инициализирующий бд.
+
+    Журнал сохраняется между перезапусками, его размер
+    ограничивает compact_logs.
+    """
+    db.connect(reuse_if_open=True)
+    if db.pragma('auto_vacuum') != 2:
+        # режим incremental включается для существующего файла
+        # только после полного VACUUM, выполняется один раз
+        db.pragma('auto_vacuum', 'incremental')
+        db.execute_sql('VACUUM')
     db.create_tables(tables)
@@ -0,0 +1,166 @@
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Callable
+
+from logger import get_logger
+
+
+log = get_logger("deadlines")
+
+
+class Deadline:
+    """Дескриптор отложенного вызова в общей куче сроков."""
+
+    def __init__(
+        self, timers, name: str, when: float, callback: Callable, args
+    ):
+        self.timers = timers
+        self.name = name
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.fired = False
+
+    def __repr__(self):
+        return f"Deadline({self.name}, {self.remaining():.1f}s)"
+
+    def remaining(self) -> float:
+        """Метод возвращающий оставшееся до срабатывания время, сек."""
+        if self.done():
+            return 0.0
+        return max(self.when - time.monotonic(), 0.0)
+
+    def cancel(self):
+        """Метод отменяющий срабатывание."""
+        self.timers.cancel(self)
+
+    def extend(self, delay: float):
+        """Метод переносящий срабатывание на delay сек от текущего срока."""
+        self.timers.reschedule(self, self.when + delay)
+
+    def done(self) -> bool:
+        return self.cancelled or self.fired
+
+
+class Deadlines:
+    """
+    Сроки сценария в одной куче на часах цикла событий.
+
+    В цикле событий взведен только один таймер на ближайший срок,
+    отмена и перенос помечают запись в куче и перевзводят таймер,
+    поэтому число сроков не влияет на стоимость тика.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.heap = []
+        self.named = {}
+        self.handle = None
+        self.armed_at = None
+        self._order = itertools.count()
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Метод привязывающий кучу сроков к циклу событий."""
+        self.loop = loop
+        self._arm()
+        return self
+
+    def schedule(
+        self, name: str, delay: float, callback: Callable, *args
+    ) -> Deadline:
+        """
+        Метод планирующий вызов через delay сек.
+
+        Срок с тем же именем заменяет предыдущий.
+        """
+        previous = self.named.get(name)
+        if previous is not None:
+            previous.cancel()
+        deadline = Deadline(
+            self, name, time.monotonic() + delay, callback, args
+        )
+        self.named[name] = deadline
+        self._push(deadline)
+        return deadline
+
+    def cancel(self, deadline: Deadline):
+        if deadline.done():
+            return
+        deadline.cancelled = True
+        if self.named.get(deadline.name) is deadline:
+            del self.named[deadline.name]
+        self._arm()
+
+    def reschedule(self, deadline: Deadline, when: float):
+        if deadline.done():
+            return
+        deadline.when = when
+        self._push(deadline)
+
+    def get(self, name: str) -> Deadline:
+        return self.named.get(name)
+
+    def remaining(self, name: str) -> float:
+        """Метод возвращающий остаток срока по имени или 0."""
+        deadline = self.named.get(name)
+        return 0.0 if deadline is None else deadline.remaining()
+
+    def pending(self) -> dict:
+        """Метод возвращающий остатки всех активных сроков."""
+        return {
+            name: deadline.remaining()
+            for name, deadline in self.named.items()
+        }
+
+    def _push(self, deadline: Deadline):
+        heapq.heappush(
+            self.heap, (deadline.when, next(self._order), deadline)
+        )
+        self._arm()
+
+    def _head(self):
+        """Метод убирающий из вершины кучи отмененные и устаревшие записи."""
+        while self.heap:
+            when, _, deadline = self.heap[0]
+            if not deadline.done() and when == deadline.when:
+                return when
+            heapq.heappop(self.heap)
+        return None
+
+    def _arm(self):
+        """Метод взводящий таймер цикла на ближайший срок."""
+        when = self._head()
+        if self.loop is None or when == self.armed_at:
+            return
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        self.armed_at = when
+        if when is not None:
+            self.handle = self.loop.call_later(
+                max(when - time.monotonic(), 0), self._fire
+            )
+
+    def _fire(self):
+        """Метод вызывающий все наступившие сроки."""
+        self.handle = self.armed_at = None
+        now = time.monotonic()
+        while (when := self._head()) is not None and when <= now:
+            _, _, deadline = heapq.heappop(self.heap)
+            deadline.fired = True
+            if self.named.get(deadline.name) is deadline:
+                del self.named[deadline.name]
+            try:
+                deadline.callback(*deadline.args)
+            except Exception as e:
+                log.error(f"{deadline.name} failed: {e}")
+        self._arm()
+
+    def stats(self) -> dict:
+        return {"pending": len(self.named), "heap": len(self.heap)}
+
+
+deadlines = Deadlines()
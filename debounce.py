@@ -0,0 +1,114 @@
+import time
+import threading
+from typing import Callable
+
+import hal
+import config
+from bridge import bridge
+
+
+# время, которое уровень на входе должен держаться, сек
+STABLE_TIME = config.current.stable_time
+# время удержания кнопки для долгого нажатия, сек
+LONG_PRESS_TIME = config.current.long_press_time
+
+# логические события кнопки
+PRESS, RELEASE, LONG_PRESS = "press", "release", "long press"
+
+
+class Debouncer:
+    """
+    Программный подавитель дребезга одного пина.
+
+    Сырые фронты с обоих краев сводятся к логическим событиям
+    нажатия, отпускания и долгого нажатия. Первое изменение уровня
+    после stable_time тишины принимается сразу, фронты внутри окна
+    только запоминаются, а итоговый уровень сверяется по таймеру.
+    """
+
+    def __init__(
+        self,
+        pins: hal.PinBackend,
+        on_press: Callable = None,
+        on_release: Callable = None,
+        on_long_press: Callable = None,
+        stable_time: float = STABLE_TIME,
+        long_press_time: float = LONG_PRESS_TIME,
+        active_level: int = hal.LOW,
+    ):
+        self.pins = pins
+        self.handlers = {
+            PRESS: on_press,
+            RELEASE: on_release,
+            LONG_PRESS: on_long_press or on_release,
+        }
+        self.stable_time = stable_time
+        self.long_press_time = long_press_time
+        self.active_level = active_level
+        self.stable = None
+        self.stable_at = float("-inf")
+        self.pressed_at = None
+        self.level = None
+        self.touched = 0.0
+        self.flush_pending = False
+        self.edges = 0
+        self.events = 0
+        self._lock = threading.Lock()
+
+    def edge(self, pin: int):
+        """Обработчик сырого фронта, вызывается из потока GPIO."""
+        level = self.pins.read(pin)
+        at = self.pins.edge_time(pin)
+        with self._lock:
+            self.edges += 1
+            self.level, self.touched = level, time.monotonic()
+            if self.stable is None:
+                self.stable = hal.HIGH - self.active_level
+            event = None
+            if level != self.stable and at - self.stable_at >= (
+                self.stable_time
+            ):
+                event = self._commit(level, at)
+            schedule = not self.flush_pending
+            self.flush_pending = True
+        if schedule:
+            bridge.call_later(self.stable_time, self.flush, pin)
+        self._emit(event, pin)
+
+    def flush(self, pin: int):
+        """Метод сверяющий итоговый уровень после окна дребезга."""
+        with self._lock:
+            quiet = time.monotonic() - self.touched
+            if quiet < self.stable_time:
+                event, schedule = None, True
+            else:
+                self.flush_pending = schedule = False
+                event = None
+                if self.level != self.stable:
+                    event = self._commit(
+                        self.level, self.pins.edge_time(pin)
+                    )
+        if schedule:
+            bridge.call_later(self.stable_time - quiet, self.flush, pin)
+        self._emit(event, pin)
+
+    def _commit(self, level: int, at: float) -> str:
+        self.stable, self.stable_at = level, at
+        if level == self.active_level:
+            self.pressed_at = at
+            return PRESS
+        held = at - self.pressed_at if self.pressed_at is not None else 0
+        self.pressed_at = None
+        return LONG_PRESS if held >= self.long_press_time else RELEASE
+
+    def _emit(self, event: str, pin: int):
+        if event is None:
+            return
+        self.events += 1
+        handler = self.handlers[event]
+        if handler is not None:
+            bridge.submit(handler, pin)
+
+    def stats(self) -> dict:
+        """Метод возвращающий число сырых фронтов и логических событий."""
+        return {"edges": self.edges, "events": self.events}
@@ -0,0 +1,110 @@
+import threading
+from typing import Callable
+
+import exceptions
+from logger import get_logger
+
+
+log = get_logger("dispatch")
+
+
+class Command:
+    """
+    Описание команды панели.
+
+    steps - конвейер шагов, каждый вызывается как step(command, source),
+    где source - вебсокет отправителя или None для кнопок и таймеров.
+    past и future - действия со светодиодами сразу после команды
+    и задачи, которые живут до следующего нажатия.
+    """
+
+    __slots__ = ("code", "name", "steps", "past", "future", "pin", "remote")
+
+    def __init__(
+        self,
+        code: int,
+        name: str,
+        steps: tuple,
+        past: tuple = (),
+        future: tuple = (),
+        pin: int = None,
+        remote: bool = False,
+    ):
+        self.code = code
+        self.name = name
+        self.steps = tuple(steps)
+        self.past = tuple(past)
+        self.future = tuple(future)
+        self.pin = pin
+        self.remote = remote
+
+    def __repr__(self):
+        return f"Command({self.code}, {self.name})"
+
+
+class DispatchTable:
+    """
+    Таблица команд по целочисленному коду.
+
+    Кнопки GPIO и вебсокеты вызывают одну и ту же таблицу,
+    выбор обработчика - один поиск по коду, конвейер шагов
+    выполняется атомарно под блокировкой сценария.
+    """
+
+    def __init__(
+        self,
+        lock: threading.RLock,
+        on_reject: Callable = None,
+        on_error: Callable = None,
+    ):
+        self.lock = lock
+        self.on_reject = on_reject
+        self.on_error = on_error
+        self.commands = {}
+        self.codes = {}
+
+    def add(self, command: Command) -> Command:
+        """Метод добавляющий команду в таблицу."""
+        self.commands[command.code] = command
+        self.codes[command.name] = command.code
+        return command
+
+    def extend(self, *commands: Command):
+        """Метод добавляющий несколько команд."""
+        for command in commands:
+            self.add(command)
+        return self
+
+    def get(self, code: int) -> Command:
+        return self.commands.get(code)
+
+    def code(self, name: str) -> int:
+        """Метод возвращающий код команды по имени или None."""
+        return self.codes.get(name)
+
+    def dispatch(self, code: int, source=None) -> bool:
+        """
+        Метод выполняющий команду по коду.
+
+        Команды вебсокетов (source задан) выполняются, только если
+        разрешены удаленно. Возвращает False для неизвестных команд.
+        """
+        command = self.commands.get(code)
+        if command is None or (source is not None and not command.remote):
+            return False
+        try:
+            with self.lock:
+                for step in command.steps:
+                    step(command, source)
+        except exceptions.InvalidButton:
+            if self.on_reject is not None:
+                self.on_reject(command, source)
+        except Exception as e:
+            log.error(f"{command.name} failed: {e}")
+            if self.on_error is not None:
+                self.on_error(command, e)
+        return True
+
+    def handler(self, code: int) -> Callable:
+        """Метод возвращающий обработчик нажатия кнопки для подавителя."""
+        return lambda channel=None: self.dispatch(code)
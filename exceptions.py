@@ -1,3 +1,8 @@
 class InvalidButton(Exception):
     """Ошибка, которая вызывается при нажатии кнопки не по порядку."""
     pass
+
+
+class ConfigError(Exception):
+    """Ошибка в файле настроек панели."""
+    pass
@@ -1,111 +1,412 @@
 import os
-import time
+import sys
+import json
+import math
 import signal
 import asyncio
 import threading
 import websockets
-import multiprocessing as mp
-from typing import Callable, Optional
-from functools import wraps
+from typing import Callable
 
-from peewee import Model
+from startup import profile
 
-import db
+import hal
+import hub
+import config
+import history
 import exceptions
+import metrics
+import protocol
+from bridge import bridge
+from clients import clients, BATCH, STATE
+from deadlines import deadlines
+from debounce import Debouncer
+from dispatch import Command, DispatchTable
 from led import (
-    LED,
-    ACCEPT_LED,
-    READY_LED,
-    START_LED,
-    CANCEL_LED,
+    PANEL_LEDS,
     accept_led,
     ready_led,
     cancel_led,
     start_led,
+    blinker,
+    bank,
+    setup_leds,
+    leds_bitmap,
+    blink_bitmap,
 )
-from logger import log
+from logger import get_logger
+from panel import panel
+from ring import events
+from scenario import machine
+from supervisor import supervisor
 
-IN_RPI = False
+profile.mark("imports")
 
-try:
-    import RPi.GPIO as GPIO
-    IN_RPI = True
-    GPIO.setwarnings(False)
-    GPIO.setmode(GPIO.BCM)
-except ModuleNotFoundError:
-    log.info("No module")
-    pass
+
+log = get_logger("gpio")
 
 # порты кнопок на плате
-WAVE, SIM, READY, ACCEPT, START, CANCEL = 4, 17, 27, 22, 23, 24
+WAVE, SIM, READY, ACCEPT, START, CANCEL = (
+    config.current.buttons[name]
+    for name in ("wave", "sim", "ready", "accept", "start", "cancel")
+)
 
-__PROCESSES__ = []
+# подавители дребезга кнопок по номеру пина
+DEBOUNCERS = {}
 
-# время через которое сценарий оканчивается после нажатия start
-CANCEL_DELAY = 15
+# имя срока автоотключения в куче сроков
+AUTO_OFF = "auto_off"
 
-# последовательность команд для проверки верной очередности
-check_command_list = {
-    "start pressed": "accept pressed",
-    "accept pressed": "ready pressed",
-    "cancel pressed": "start pressed",
-}
+# сценарий восстановлен из журнала, команды вебсокетов принимаются
+recovered = threading.Event()
 
-THREAD = None
-SIGNAL = False
-
-# активные ws подключения
+# активные ws подключения в текстовом и бинарном режимах
 CONNECTIONS = set()
+BINARY_CONNECTIONS = set()
+# подключения, подписанные на периодическую статистику
+STATS_CONNECTIONS = set()
+
+metrics.registry.gauge(
+    "rpi_ws_clients",
+    "Подключенные вебсокет клиенты",
+    lambda: len(CONNECTIONS) + len(BINARY_CONNECTIONS),
+)
 
 
-def start_ready_blinking():
+def broadcast(
+    message: str, opcode: int = protocol.OP_COMMAND, command: str = None
+):
     """
-    Метод запускающий мигание ready_led
-    и активирующий сценарий, после команды 'ready' с вебсокетами.
+    Метод рассылающий сообщение всем подключениям.
+
+    Бинарный кадр кодируется один раз и ставится
+    в очереди всех бинарных клиентов общим буфером.
+    Событие запоминается в кольцевом буфере для досылки.
+    """
+    seq = protocol.next_seq()
+    state, leds = machine.state, leds_bitmap()
+    events.append(
+        seq,
+        opcode,
+        protocol.COMMAND_CODES.get(command, 0),
+        protocol.STATE_CODES[state],
+        leds,
+        message if message != command else None,
+    )
+    metrics.BROADCASTS.inc()
+    clients.send(CONNECTIONS, message)
+    hub.push({"type": "event", "command": command, "text": message})
+    if BINARY_CONNECTIONS:
+        clients.send(
+            BINARY_CONNECTIONS,
+            protocol.encode(
+                opcode,
+                seq,
+                command=command,
+                state=state,
+                leds=leds,
+                text=message if opcode == protocol.OP_ERROR else None,
+            ),
+        )
+    return seq
+
+
+def send_since(websocket: websockets, seq: int):
     """
-    global SIGNAL, THREAD
-    THREAD = threading.Event()
-    threading.Thread(target=ready_led._blinking, args=(THREAD,)).start()
-    SIGNAL = True
-    return THREAD, SIGNAL
+    Метод досылающий клиенту события с номером больше seq из памяти.
+
+    Текстовые клиенты получают события объектами с номером
+    {"type": "event", "seq": ...}, бинарные - исходными кадрами.
+    В конце отправляется {"type": "since_end", "last": seq, "boot": id}.
+    Если часть событий уже вытеснена из буфера или seq выдан
+    до перезапуска сервера, клиент сначала получает
+    {"type": "since_gap", ...} и полный снимок панели.
+    Пропущенные события ставятся в очередь клиента одной пачкой,
+    поэтому ее размер не ограничивает досылку.
+    """
+    gap, missed = events.since(seq, protocol.last_seq)
+    if gap:
+        clients.send(
+            {websocket},
+            json.dumps(
+                {
+                    "type": "since_gap",
+                    "after": seq,
+                    "from": events.evicted_seq,
+                    "boot": protocol.BOOT,
+                },
+                separators=(",", ":"),
+            ),
+        )
+        send_snapshot(websocket)
+    binary = websocket in BINARY_CONNECTIONS
+    last = min(seq, protocol.last_seq)
+    batch = []
+    for last, at, opcode, command, state, leds, text in missed:
+        command = protocol.COMMANDS.get(command)
+        if binary:
+            message = protocol.encode(
+                opcode,
+                last,
+                command=command,
+                state=protocol.STATES[state],
+                leds=leds,
+                text=text if opcode == protocol.OP_ERROR else None,
+            )
+        else:
+            message = json.dumps(
+                {
+                    "type": "event",
+                    "seq": last,
+                    "time": at,
+                    "opcode": opcode,
+                    "command": command,
+                    "text": text or command,
+                },
+                separators=(",", ":"),
+            )
+        batch.append(message)
+    batch.append(
+        json.dumps(
+            {"type": "since_end", "last": last, "boot": protocol.BOOT},
+            separators=(",", ":"),
+        )
+    )
+    clients.send({websocket}, batch, BATCH)
+    return len(missed)
 
 
-def set_thread():
-    """Метод прекращеия мигания ready_led."""
-    global THREAD
-    THREAD.set()
-    return THREAD
+def send_state(opcode: int, version: int, values: dict, connections=None):
+    """
+    Метод рассылающий снимок или изменение состояния панели.
+
+    Без connections сообщение уходит всем подключениям.
+    """
+    text, binary = CONNECTIONS, BINARY_CONNECTIONS
+    if connections is not None:
+        text, binary = text & connections, binary & connections
+    if text:
+        clients.send(
+            text, protocol.state_text(opcode, version, values), STATE
+        )
+    if binary:
+        clients.send(
+            binary,
+            protocol.encode_state(
+                opcode, protocol.next_seq(), version, values
+            ),
+            STATE,
+        )
+
+
+def panel_snapshot() -> dict:
+    """
+    Метод возвращающий снимок панели с текущим остатком автоотключения.
+
+    В состоянии панели остаток хранится на момент последнего изменения,
+    поэтому для снимка он считается заново.
+    """
+    return {**panel.snapshot(), "timeout": auto_off_remaining()}
+
+
+def send_snapshot(websocket: websockets):
+    """Метод отправляющий клиенту полный снимок состояния панели."""
+    send_state(
+        protocol.OP_SNAPSHOT, panel.version, panel_snapshot(), {websocket}
+    )
+
+
+def resync(websocket: websockets, version: int):
+    """
+    Метод досылающий клиенту изменения после его версии
+    или полный снимок, если история их уже не содержит.
+    """
+    deltas = panel.since(version)
+    if deltas is None:
+        return send_snapshot(websocket)
+    for delta_version, delta in deltas:
+        send_state(protocol.OP_DELTA, delta_version, delta, {websocket})
+
+
+def publish_state(command: str = None):
+    """Метод рассылающий изменившиеся поля состояния панели."""
+    values = {
+        "state": machine.state,
+        "leds": leds_bitmap(),
+        "blink": blink_bitmap(),
+        "timeout": auto_off_remaining(),
+    }
+    if command is not None:
+        values["buttons"] = protocol.buttons_bitmap(command)
+    delta = panel.update(**values)
+    if delta:
+        send_state(protocol.OP_DELTA, panel.version, delta)
+        hub.push({"type": "delta", "version": panel.version, **delta})
+    return delta
+
+
+def send_stats(stats: dict):
+    """Метод рассылающий статистику подписанным клиентам."""
+    if STATS_CONNECTIONS:
+        clients.send(
+            STATS_CONNECTIONS,
+            json.dumps(
+                {
+                    **stats,
+                    "clients": clients.stats(),
+                    "tasks": supervisor.stats(),
+                    "deadlines": deadlines.pending(),
+                    "events": events.stats(),
+                },
+                separators=(",", ":"),
+            ),
+        )
+
+
+def set_protocol(websocket: websockets, mode: str):
+    """Метод переключающий режим подключения."""
+    if mode == protocol.BINARY:
+        CONNECTIONS.discard(websocket)
+        BINARY_CONNECTIONS.add(websocket)
+    else:
+        BINARY_CONNECTIONS.discard(websocket)
+        CONNECTIONS.add(websocket)
+    return mode
+
+
+def start_ready_blinking():
+    """
+    Метод запускающий мигание ready_led
+    после команды 'ready' с вебсокетами.
+    """
+    return create_handle(ready_led.blinking)
 
 
 def abort_scenario():
     """Метод прерывающий сценарий."""
-    global SIGNAL
-    set_thread()
     stop_processes()
-    ready_led.turn_off()
-    start_led.turn_off()
-    accept_led.turn_off()
-    cancel_led.turn_off()
-    log.info(THREAD)
-    SIGNAL = False
-    return THREAD, SIGNAL
+    bank.off()
+    return supervisor
+
+
+machine.on("ready", start_ready_blinking)
+machine.on("cancel", abort_scenario)
+machine.on("timeout", abort_scenario)
+
+
+def on_protocol(websocket: websockets, message: str):
+    """Обработчик запроса режима вида 'protocol:binary:2'."""
+    mode = set_protocol(websocket, protocol.negotiate(message))
+    if mode == protocol.BINARY:
+        clients.send(
+            {websocket},
+            protocol.encode(protocol.OP_HELLO, protocol.next_seq()),
+        )
+    send_snapshot(websocket)
+
+
+def on_stats(websocket: websockets, message: str):
+    """Обработчик подписки на статистику: 'stats:on' или 'stats:off'."""
+    if message == "stats:on":
+        STATS_CONNECTIONS.add(websocket)
+    else:
+        STATS_CONNECTIONS.discard(websocket)
+
+
+def on_history(websocket: websockets, message: str):
+    """
+    Обработчик запроса истории журнала, возвращает задачу выгрузки.
+
+    До открытия журнала запрос отклоняется.
+    """
+    if not recovered.is_set():
+        return clients.send({websocket}, "history command is unavailable now!")
+    return asyncio.create_task(history.send_history(websocket, message))
+
+
+def on_extend(websocket: websockets, message: str):
+    """Обработчик продления автоотключения вида 'extend:5'."""
+    try:
+        extend_auto_off(float(message.partition(":")[2]))
+    except (ValueError, exceptions.InvalidButton):
+        clients.send({websocket}, "extend command is unavailable now!")
+
+
+def on_since(websocket: websockets, message: str):
+    """Обработчик досылки событий вида 'since:N'."""
+    try:
+        seq = int(message.partition(":")[2])
+    except ValueError:
+        return clients.send({websocket}, "Invalid since request")
+    send_since(websocket, seq)
+
+
+def on_resync(websocket: websockets, message: str):
+    """Обработчик досинхронизации состояния вида 'resync:N'."""
+    try:
+        resync(websocket, int(message.partition(":")[2]))
+    except ValueError:
+        send_snapshot(websocket)
+
+
+# служебные запросы вебсокета по префиксу до двоеточия
+REQUESTS = {
+    "protocol": on_protocol,
+    "stats": on_stats,
+    "history": on_history,
+    "extend": on_extend,
+    "since": on_since,
+    "resync": on_resync,
+}
 
 
 async def register(websocket: websockets):
-    """Обработчик сообщений с вебсокета."""
+    """
+    Обработчик сообщений с вебсокета.
+
+    Служебные запросы выбираются по префиксу из REQUESTS,
+    остальные сообщения - команды из общей таблицы команд.
+    """
     CONNECTIONS.add(websocket)
+    clients.add(websocket, resync=send_snapshot)
+    metrics.CONNECTS.inc()
     log.info("Connect registration...")
+    send_snapshot(websocket)
+    tasks = set()
     try:
         while True:
             message = await websocket.recv()
             log.info(message)
-            if message == "ready":
-                start_ready_blinking()
-            if message == "cancel":
-                abort_scenario()
+            try:
+                if isinstance(message, bytes):
+                    message = protocol.decode(message)["command"]
+                elif (
+                    request := REQUESTS.get(message.partition(":")[0])
+                ) is not None:
+                    task = request(websocket, message)
+                    if task is not None:
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    continue
+            except ValueError as e:
+                clients.send({websocket}, str(e))
+                continue
+            except Exception as e:
+                # ошибка разбора запроса не должна закрывать подключение
+                log.error(f"Request {message!r} failed: {e}")
+                clients.send({websocket}, f"Invalid request {message}")
+                continue
+            commands.dispatch(commands.code(message), websocket)
+    except websockets.ConnectionClosed:
+        pass
     finally:
+        for task in tasks:
+            task.cancel()
         log.info("Connection abroted.")
-        CONNECTIONS.remove(websocket)
+        CONNECTIONS.discard(websocket)
+        BINARY_CONNECTIONS.discard(websocket)
+        STATS_CONNECTIONS.discard(websocket)
+        clients.remove(websocket)
 
 
 async def main():
@@ -113,219 +414,352 @@ async def main():
     loop = asyncio.get_running_loop()
     stop = loop.create_future()
     loop.add_signal_handler(signal.SIGTERM, stop.set_result, None)
+    loop.add_signal_handler(signal.SIGHUP, reload_config)
+    apply_config(config.current)
+    bridge.attach(loop)
+    deadlines.attach(loop)
+    bridge_task = asyncio.create_task(bridge.run())
+    blink_task = asyncio.create_task(blinker.run())
     async with websockets.serve(
         register,
         port=8766,
     ):
-        # main loop
+        # порт открыт до инициализации журнала и платы,
+        # клиенты получают снимок панели сразу после подключения
+        profile.mark("listening")
         log.info("Connection served")
-        while True:
-            await asyncio.Future()
+        with profile.phase("storage"):
+            tail = await loop.run_in_executor(None, init_storage)
+        with profile.phase("hardware"):
+            setup_rpi_handlers()
+        with profile.phase("recovery"):
+            recover(tail)
+        uplink_task = hub.connect_uplink(panel_snapshot)
+        stats_task = asyncio.create_task(metrics.publish_stats(send_stats))
+        metrics_server = await metrics.serve()
+        profile.mark("live")
+        profile.report()
+        # main loop
+        try:
+            await stop
+        finally:
+            supervisor.cancel()
+            if metrics_server is not None:
+                metrics_server.close()
+            stats_task.cancel()
+            blink_task.cancel()
+            bridge_task.cancel()
+            if uplink_task is not None:
+                uplink_task.cancel()
+
+
+def auto_off():
+    """
+    Завершает сценарий и выключает все светодиоды
+    по истечение cancel_delay сек, вызывается в цикле событий.
+    """
+    with machine.lock:
+        if machine.can("timeout"):
+            commands.dispatch(commands.code("timeout"))
+    log.info("All LEDs is off now!")
 
 
-def command_wrapper(function):
+def start_auto_off_timer(*args, **kwargs):
     """
-    Декоратор, который отправляет логи и
-    сообщения по ws и выполняет основной алгоритм.
+    Запускает срок выключения всех светодиодов.
+
+    Срок отменяется супервизором при следующем нажатии.
     """
+    log.info("started timer for cancel")
+    return deadlines.schedule(
+        AUTO_OFF, config.current.cancel_delay, auto_off
+    )
 
-    @wraps(function)
-    def wrapper(self, channel=None, *args, **kwargs):
-        try:
-            global SIGNAL
-            global __PROCESSES__
-            log.info(THREAD)
-            function(self, channel)
-            log.info(self.command)
-            websockets.broadcast(CONNECTIONS, self.command)
-            if len(__PROCESSES__) > 0:
-                stop_processes()
-            if self.led:
-                for key in ["past", "future"]:
-                    if self.led.get(key):
-                        for led in self.led[key]:
-                            (
-                                led()
-                                if key == "past"
-                                else create_process(led, __PROCESSES__)
-                            )
-            if "start" in self.command:
-                SIGNAL = False
-        except exceptions.InvalidButton:
-            websockets.broadcast(
-                CONNECTIONS, f"{self.command} command is unavailable now!"
-            )
-        except Exception as e:
-            websockets.broadcast(CONNECTIONS, str(e))
-            log.error(str(e))
-        return __PROCESSES__, SIGNAL
 
-    return wrapper
+def extend_auto_off(delay: float):
+    """Метод продлевающий срок автоотключения на delay сек."""
+    deadline = deadlines.get(AUTO_OFF)
+    if deadline is None or not 0 < delay <= config.current.cancel_delay:
+        raise exceptions.InvalidButton("Nothing to extend")
+    with machine.lock:
+        deadline.extend(delay)
+        publish_state()
+    log.info(f"auto off extended by {delay}s")
+    return deadline
 
 
-class Commands:
-    """Абстрактный интерфейс обработчика событий после нажатия кнопки."""
+def auto_off_remaining() -> int:
+    """Метод возвращающий остаток срока автоотключения в целых секундах."""
+    return min(math.ceil(deadlines.remaining(AUTO_OFF)), 255)
 
-    def __init__(
-        self,
-        command: str,
-        checker: Callable = None,
-        model: Optional[Model] = None,
-        led: Optional[dict[LED]] = None,
-    ):
-        self.command = command
-        self.checker = checker
-        self.model = model
-        self.led = led
-
-    @command_wrapper
-    def basic_command(self, channel):
-        """Стандартный обработчик нажатия кнопки."""
-        ...
-
-    @command_wrapper
-    def trigger_command(self, channel=None):
-        """Обработчик создающий запись о нажатии в бд."""
-        global SIGNAL
-        log.info(SIGNAL)
-        if SIGNAL:
-            return self.model.create(command=self.command)
-
-    def check_command(self, channel=None):
-        """Обработчик проверяющий опред условия перед нажатием кнопки."""
-        global SIGNAL
-        log.info(SIGNAL)
-        if self.checker(check_command_list[self.command]) and (
-            SIGNAL or "cancel" in self.command
-        ):
-            return self.trigger_command(channel)
-        log.info("failed checking")
-        raise exceptions.InvalidButton("Button pressed in wrong order")
-
-
-def start_auto_off_timer(process, *args, **kwargs):
-    """Выключает все светодиоды по истечение 15 сек."""
-    log.info("started timer for cancel")
-    time.sleep(CANCEL_DELAY)
-    stop_processes(process)
-    GPIO.output(READY_LED, GPIO.LOW)
-    GPIO.output(ACCEPT_LED, GPIO.LOW)
-    GPIO.output(START_LED, GPIO.LOW)
-    GPIO.output(CANCEL_LED, GPIO.LOW)
-    log.info("All LEDs is off now!")
+
+def apply_config(settings: config.PanelConfig):
+    """
+    Метод применяющий тайминги и переходы сценария без перезапуска.
+
+    Каждое значение подменяется одним присваиванием, подключения
+    и текущий сценарий сохраняются.
+    """
+    with machine.lock:
+        machine.transitions = settings.transitions
+    blinker.period = settings.blink_period
+    for led in PANEL_LEDS:
+        led.blink_period = 2 * settings.blink_period
+        led.duty_cycle = settings.duty_cycle
+    for debouncer in DEBOUNCERS.values():
+        debouncer.stable_time = settings.stable_time
+        debouncer.long_press_time = settings.long_press_time
+    return settings
+
+
+def reload_config():
+    """
+    Обработчик SIGHUP: перечитывает файл настроек.
+
+    Пины перенастраиваются только при перезапуске.
+    """
+    previous = config.current
+    settings = config.reload()
+    if settings is None:
+        return None
+    if (settings.buttons, settings.leds) != (previous.buttons, previous.leds):
+        log.warning("Pin changes will apply after restart")
+    return apply_config(settings)
+
+
+def journal(command: str):
+    """Метод записывающий в журнал событие сценария не от кнопки."""
+    import db
+
+    return db.logs_writer.put(db.Logs(command=command))
+
+
+def recover(tail: list):
+    """
+    Метод восстанавливающий сценарий и светодиоды по хвосту журнала.
+
+    События после последней границы сценария повторяются с их
+    временем: переход сценария и светодиоды без записи и рассылки.
+    Срок автоотключения отсчитывается от нажатия start.
+    Недопустимые в текущем состоянии события пропускаются.
+    """
+    with machine.lock:
+        for _, dt, name in tail:
+            command = commands.get(commands.code(name))
+            try:
+                machine.fire(name, at=dt.timestamp())
+            except exceptions.InvalidButton:
+                log.info(f"Skipped {name} while recovering")
+                continue
+            if command is not None and leds in command.steps:
+                reset(command)
+                leds(command)
+        deadline = deadlines.get(AUTO_OFF)
+        if deadline is not None:
+            deadline.extend(-machine.since())
+        log.info(f"Recovered {machine.state} from {len(tail)} events")
+        publish_state()
+        recovered.set()
+    return machine.state
 
 
 def stop_processes(process=None):
     """
     Метод останавливающий все созданные
-    нажатием предыдущей кнопки процессы.
+    нажатием предыдущей кнопки задачи.
+    """
+    supervisor.cancel(process)
+    return supervisor
+
+
+def create_handle(command, *args, **kwargs):
+    """
+    Метод запускающий будущие задачи при нажатии кнопки.
+
+    Задачи отдаются супервизору, который отменяет их
+    при следующем нажатии и следит, чтобы они завершились.
+    """
+    supervisor.spawn(command, *args, **kwargs)
+    return supervisor
+
+
+def init_storage():
+    """
+    Метод открывающий журнал и запускающий его запись.
+
+    Импорт peewee и работа с файлом бд выполняются
+    после открытия порта, в пуле потоков. Возвращает хвост
+    журнала для восстановления сценария.
+    """
+    import db
+
+    db.init_db(db.database, [db.Logs, db.LogsHourly])
+    db.logs_writer.start()
+    return db.logs_tail(machine.boundaries())
+
+
+def close_storage():
+    """Метод сохраняющий оставшиеся записи журнала, если он был открыт."""
+    if "db" in sys.modules:
+        sys.modules["db"].logs_writer.stop()
+
+
+def guard(command: Command, source=None):
+    """
+    Шаг, отклоняющий команды вебсокетов до восстановления сценария:
+    иначе повтор журнала перезапишет их переход.
+    """
+    if source is not None and not recovered.is_set():
+        raise exceptions.InvalidButton("Scenario is not recovered yet")
+
+
+def transition(command: Command, source=None):
+    """Шаг проверки очередности и перехода сценария."""
+    machine.fire(command.name)
+
+
+def persist(command: Command, source=None):
+    """Шаг записи команды в журнал."""
+    journal(command.name)
+
+
+def reset(command: Command, source=None):
+    """Шаг остановки задач, созданных предыдущей командой."""
+    if len(supervisor) > 0:
+        stop_processes()
+
+
+def leds(command: Command, source=None):
+    """Шаг действий со светодиодами и запуска будущих задач."""
+    for action in command.past:
+        action()
+    for action in command.future:
+        create_handle(action)
+
+
+def announce(command: Command, source=None):
+    """Шаг рассылки нажатия всем подключениям."""
+    log.info(command.name)
+    broadcast(command.name, command=command.name)
+    metrics.PRESSES.inc(command.name)
+
+
+def publish(command: Command, source=None):
+    """Шаг рассылки изменившегося состояния панели."""
+    publish_state(command.name if command.pin is not None else None)
+
+
+def reject(command: Command, source=None):
+    """
+    Метод сообщающий о команде не по порядку: вебсокету-отправителю
+    или, для кнопок и таймеров, всем подключениям.
+    """
+    message = f"{command.name} command is unavailable now!"
+    if source is not None:
+        return clients.send({source}, message)
+    metrics.REJECTED.inc(command.name)
+    broadcast(message, opcode=protocol.OP_REJECTED, command=command.name)
+
+
+def fail(command: Command, error: Exception):
+    """Метод рассылающий ошибку выполнения команды."""
+    metrics.ERRORS.inc()
+    broadcast(str(error), opcode=protocol.OP_ERROR)
+
+
+# конвейеры шагов: нажатие кнопки сценария, прочие кнопки
+# и команды вебсокетов и таймеров
+BUTTON_STEPS = (transition, persist, reset, leds, announce, publish)
+PLAIN_STEPS = (announce, publish)
+EVENT_STEPS = (guard, transition, persist, publish)
+
+
+def command(name: str, steps: tuple, **kwargs) -> Command:
     """
-    processes = process if process else __PROCESSES__
-    if process is not None and process != []:
-        for elem_index in range(len(processes)):
-            pid = processes.pop()
-            os.kill(pid, signal.SIGKILL)
-            log.info(f"{pid} killed!")
+    Метод описывающий команду таблицы.
 
+    Код берется из протокола, поэтому новая команда добавляется
+    в protocol.COMMAND_CODES и описывается здесь по имени.
+    """
+    return Command(protocol.COMMAND_CODES[name], name, steps, **kwargs)
+
+
+commands = DispatchTable(machine.lock, on_reject=reject, on_error=fail)
+
+"""Таблица команд, коды берутся из protocol.COMMAND_CODES."""
+commands.extend(
+    command("wave pressed", PLAIN_STEPS, pin=WAVE),
+    command("sim pressed", PLAIN_STEPS, pin=SIM),
+    command(
+        "ready pressed",
+        BUTTON_STEPS,
+        past=[ready_led.turn_on],
+        future=[accept_led.blinking],
+        pin=READY,
+    ),
+    command(
+        "accept pressed",
+        BUTTON_STEPS,
+        past=[accept_led.turn_on],
+        future=[start_led.blinking],
+        pin=ACCEPT,
+    ),
+    command(
+        "start pressed",
+        BUTTON_STEPS,
+        past=[start_led.turn_on],
+        future=[cancel_led.blinking, start_auto_off_timer],
+        pin=START,
+    ),
+    command(
+        "cancel pressed",
+        BUTTON_STEPS,
+        past=[abort_scenario],
+        pin=CANCEL,
+    ),
+    command("ready", EVENT_STEPS, remote=True),
+    command("cancel", EVENT_STEPS, remote=True),
+    command("timeout", EVENT_STEPS),
+)
 
-def create_process(command, *args, **kwargs):
+
+def add_button(pins: hal.PinBackend, pin: int, handler: Callable):
     """
-    Метод создающий будущие процессы при нажатии кнопки.
+    Метод подписывающий обработчик на нажатие кнопки.
+
+    Сырые фронты проходят программный подавитель дребезга,
+    в цикл событий попадает только логическое нажатие.
     """
-    p = mp.Process(target=command, args=args)
-    p.start()
-    __PROCESSES__.append(p.pid)
-    return __PROCESSES__
+    debouncer = DEBOUNCERS[pin] = Debouncer(pins, on_press=handler)
+    pins.add_event_detect(pin, callback=debouncer.edge)
+    return debouncer
 
 
 def setup_rpi_handlers():
-    """Метод инициализации кнопок и севтодиодов на плате."""
+    """
+    Метод инициализации кнопок и севтодиодов на плате.
 
+    Кнопки берутся из таблицы команд: пин каждой команды
+    подписывается на ее код.
+    """
     log.info("Setup")
-
-    """Кнопки."""
-    GPIO.setup(WAVE, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # волна
-    GPIO.setup(SIM, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # sim
-    GPIO.setup(READY, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # готов
-    GPIO.setup(ACCEPT, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # подтвердить
-    GPIO.setup(CANCEL, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # пуск
-    GPIO.setup(START, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # отмена
-
-    """Триггеры на кнопки,"""
-    GPIO.add_event_detect(
-        SIM,
-        GPIO.BOTH,
-        callback=Commands(command="sim pressed").basic_command,
-        bouncetime=40,
-    )
-    GPIO.add_event_detect(
-        WAVE,
-        GPIO.BOTH,
-        callback=Commands(command="wave pressed").basic_command,
-        bouncetime=40,
-    )
-    GPIO.add_event_detect(
-        READY,
-        GPIO.BOTH,
-        callback=Commands(
-            command="ready pressed",
-            model=db.Logs,
-            led={
-                "past": [set_thread, ready_led.turn_on],
-                "future": [accept_led.blinking],
-            },
-        ).trigger_command,
-        bouncetime=40,
-    )
-    GPIO.add_event_detect(
-        ACCEPT,
-        GPIO.BOTH,
-        callback=Commands(
-            command="accept pressed",
-            model=db.Logs,
-            led={
-                "past": [accept_led.turn_on],
-                "future": [start_led.blinking],
-            },
-            checker=db.Logs.check_last_elem_command,
-        ).check_command,
-        bouncetime=40,
-    )
-    GPIO.add_event_detect(
-        START,
-        GPIO.BOTH,
-        callback=Commands(
-            command="start pressed",
-            model=db.Logs,
-            led={
-                "past": [start_led.turn_on],
-                "future": [cancel_led.blinking, start_auto_off_timer],
-            },
-            checker=db.Logs.check_last_elem_command,
-        ).check_command,
-        bouncetime=40,
-    )
-    GPIO.add_event_detect(
-        CANCEL,
-        GPIO.BOTH,
-        callback=Commands(
-            command="cancel pressed",
-            led={
-                "past": [abort_scenario],
-                "future": None,
-            },
-            model=db.Logs,
-            checker=db.Logs.check_button_was_pressed_less_than_15_sec,
-        ).check_command,
-        bouncetime=40,
-    )
+    pins = hal.get_backend()
+    setup_leds()
+    for command in commands.commands.values():
+        if command.pin is not None:
+            pins.setup_input(command.pin)
+            add_button(pins, command.pin, commands.handler(command.code))
 
 
-if __name__ == "__main__":
+if __name__ == "__main__" and os.environ.get(hub.MODE_ENV) == "hub":
+    try:
+        asyncio.run(hub.main())
+    except KeyboardInterrupt:
+        pass
+elif __name__ == "__main__":
     try:
-        db.init_db(db.database, [db.Logs])
-        if IN_RPI:
-            setup_rpi_handlers()
         asyncio.run(main())
     except KeyboardInterrupt:
-        GPIO.cleanup()
+        hal.get_backend().cleanup()
+    finally:
+        close_storage()
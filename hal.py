@@ -0,0 +1,428 @@
+import os
+import time
+import threading
+from collections import defaultdict
+from typing import Callable
+
+from logger import get_logger
+
+
+log = get_logger("hal")
+
+
+LOW, HIGH = 0, 1
+
+# переменная окружения для выбора бэкенда при старте
+BACKEND_ENV = "RPI_GPIO_BACKEND"
+
+
+class PinBackend:
+    """Абстрактный интерфейс доступа к пинам платы."""
+
+    name = None
+
+    def setup_input(self, pin: int, pull_up: bool = True):
+        raise NotImplementedError
+
+    def setup_output(self, pin: int, value: int = LOW):
+        raise NotImplementedError
+
+    def write(self, pin: int, value: int):
+        raise NotImplementedError
+
+    def read(self, pin: int) -> int:
+        raise NotImplementedError
+
+    def write_many(self, values: dict):
+        """Метод записывающий уровни {пин: уровень} одной пачкой."""
+        for pin, value in values.items():
+            self.write(pin, value)
+
+    def start_blink(self, pin: int, period: float, duty: float) -> bool:
+        """
+        Метод запускающий мигание пина средствами бэкенда.
+
+        Возвращает False, если бэкенд не умеет мигать сам
+        и мигание нужно вести программно.
+        """
+        return False
+
+    def stop_blink(self, pin: int):
+        ...
+
+    def add_event_detect(
+        self, pin: int, callback: Callable, bouncetime: int = None
+    ):
+        """Метод подписывающий callback(pin) на оба фронта сигнала."""
+        raise NotImplementedError
+
+    def edge_time(self, pin: int) -> float:
+        """Метод возвращающий время текущего фронта на пине."""
+        return time.monotonic()
+
+    def cleanup(self):
+        ...
+
+
+class RPiGPIOBackend(PinBackend):
+    """Бэкенд на RPi.GPIO."""
+
+    name = "rpi"
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+
+        self.GPIO = GPIO
+        self.pwm = {}
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+
+    def setup_input(self, pin: int, pull_up: bool = True):
+        self.GPIO.setup(
+            pin,
+            self.GPIO.IN,
+            pull_up_down=self.GPIO.PUD_UP if pull_up else self.GPIO.PUD_DOWN,
+        )
+
+    def setup_output(self, pin: int, value: int = LOW):
+        self.GPIO.setup(pin, self.GPIO.OUT, initial=value)
+
+    def write(self, pin: int, value: int):
+        self.GPIO.output(pin, value)
+
+    def write_many(self, values: dict):
+        self.GPIO.output(list(values), list(values.values()))
+
+    def start_blink(self, pin: int, period: float, duty: float) -> bool:
+        # ШИМ RPi.GPIO работает в потоке C-расширения без пробуждений Python
+        pwm = self.pwm.get(pin)
+        if pwm is None:
+            pwm = self.pwm[pin] = self.GPIO.PWM(pin, 1 / period)
+        else:
+            pwm.ChangeFrequency(1 / period)
+        pwm.start(duty * 100)
+        return True
+
+    def stop_blink(self, pin: int):
+        pwm = self.pwm.get(pin)
+        if pwm is not None:
+            pwm.stop()
+
+    def read(self, pin: int) -> int:
+        return self.GPIO.input(pin)
+
+    def add_event_detect(
+        self, pin: int, callback: Callable, bouncetime: int = None
+    ):
+        kwargs = {"bouncetime": bouncetime} if bouncetime else {}
+        self.GPIO.add_event_detect(
+            pin, self.GPIO.BOTH, callback=callback, **kwargs
+        )
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+
+class LGPIOBackend(PinBackend):
+    """Бэкенд на lgpio (/dev/gpiochip)."""
+
+    name = "lgpio"
+
+    def __init__(self, chip: int = 0):
+        import lgpio
+
+        self.lgpio = lgpio
+        try:
+            self.handle = lgpio.gpiochip_open(chip)
+        except lgpio.error as e:
+            # без /dev/gpiochip выбор переходит к следующему бэкенду
+            raise RuntimeError(f"gpiochip{chip}: {e}") from e
+        self.callbacks = []
+
+    def setup_input(self, pin: int, pull_up: bool = True):
+        flags = (
+            self.lgpio.SET_PULL_UP if pull_up else self.lgpio.SET_PULL_DOWN
+        )
+        self.lgpio.gpio_claim_input(self.handle, pin, flags)
+
+    def setup_output(self, pin: int, value: int = LOW):
+        self.lgpio.gpio_claim_output(self.handle, pin, value)
+
+    def write(self, pin: int, value: int):
+        self.lgpio.gpio_write(self.handle, pin, value)
+
+    def start_blink(self, pin: int, period: float, duty: float) -> bool:
+        self.lgpio.tx_pwm(self.handle, pin, 1 / period, duty * 100)
+        return True
+
+    def stop_blink(self, pin: int):
+        self.lgpio.tx_pwm(self.handle, pin, 0, 0)
+
+    def read(self, pin: int) -> int:
+        return self.lgpio.gpio_read(self.handle, pin)
+
+    def add_event_detect(
+        self, pin: int, callback: Callable, bouncetime: int = None
+    ):
+        if bouncetime:
+            self.lgpio.gpio_set_debounce_micros(
+                self.handle, pin, bouncetime * 1000
+            )
+        self.lgpio.gpio_claim_alert(
+            self.handle, pin, self.lgpio.BOTH_EDGES
+        )
+        self.callbacks.append(
+            self.lgpio.callback(
+                self.handle,
+                pin,
+                self.lgpio.BOTH_EDGES,
+                lambda chip, gpio, level, tick: callback(gpio),
+            )
+        )
+
+    def cleanup(self):
+        for callback in self.callbacks:
+            callback.cancel()
+        self.lgpio.gpiochip_close(self.handle)
+
+
+class GPIOZeroBackend(PinBackend):
+    """Бэкенд на gpiozero."""
+
+    name = "gpiozero"
+
+    def __init__(self):
+        import gpiozero
+
+        # фабрика пинов выбирается лениво, при первом устройстве,
+        # поэтому проверяется сразу: без платы выбор переходит к sim
+        try:
+            gpiozero.Device.ensure_pin_factory()
+        except gpiozero.GPIOZeroError as e:
+            raise RuntimeError(f"No gpiozero pin factory: {e}") from e
+        self.gpiozero = gpiozero
+        self.devices = {}
+
+    def setup_input(self, pin: int, pull_up: bool = True):
+        self.devices[pin] = self.gpiozero.DigitalInputDevice(
+            pin, pull_up=pull_up
+        )
+
+    def setup_output(self, pin: int, value: int = LOW):
+        self.devices[pin] = self.gpiozero.DigitalOutputDevice(
+            pin, initial_value=bool(value)
+        )
+
+    def write(self, pin: int, value: int):
+        self.devices[pin].value = value
+
+    def start_blink(self, pin: int, period: float, duty: float) -> bool:
+        self.devices[pin].blink(
+            on_time=period * duty,
+            off_time=period * (1 - duty),
+            background=True,
+        )
+        return True
+
+    def stop_blink(self, pin: int):
+        self.devices[pin].off()
+
+    def read(self, pin: int) -> int:
+        return self.devices[pin].value
+
+    def add_event_detect(
+        self, pin: int, callback: Callable, bouncetime: int = None
+    ):
+        device = self.devices[pin]
+        if bouncetime:
+            # gpiozero задает дребезг только при создании устройства
+            device.close()
+            device = self.devices[pin] = self.gpiozero.DigitalInputDevice(
+                pin, pull_up=device.pull_up, bounce_time=bouncetime / 1000
+            )
+        device.when_activated = lambda: callback(pin)
+        device.when_deactivated = lambda: callback(pin)
+
+    def cleanup(self):
+        for device in self.devices.values():
+            device.close()
+        self.devices = {}
+
+
+class SimulatedBackend(PinBackend):
+    """
+    Бэкенд в памяти для тестов и нагрузочных прогонов без платы.
+
+    Фронты подаются методами inject/press/pulse_train,
+    фильтр bouncetime повторяет поведение RPi.GPIO.
+    """
+
+    name = "sim"
+
+    def __init__(self, pwm: bool = True):
+        self.pwm = pwm
+        self.blinking = {}
+        self.levels = {}
+        self.outputs = set()
+        self.callbacks = defaultdict(list)
+        self.bouncetime = {}
+        self.last_edge = {}
+        self.writes = 0
+        self.edges = 0
+        self.filtered = 0
+        self.clock = 0.0
+        self.edge_at = {}
+        self._lock = threading.Lock()
+
+    def setup_input(self, pin: int, pull_up: bool = True):
+        self.levels[pin] = HIGH if pull_up else LOW
+
+    def setup_output(self, pin: int, value: int = LOW):
+        self.outputs.add(pin)
+        self.levels[pin] = value
+
+    def write(self, pin: int, value: int):
+        self.levels[pin] = value
+        self.writes += 1
+
+    def write_many(self, values: dict):
+        self.levels.update(values)
+        self.writes += 1
+
+    def start_blink(self, pin: int, period: float, duty: float) -> bool:
+        if self.pwm:
+            self.blinking[pin] = (period, duty)
+        return self.pwm
+
+    def stop_blink(self, pin: int):
+        self.blinking.pop(pin, None)
+
+    def read(self, pin: int) -> int:
+        return self.levels.get(pin, LOW)
+
+    def add_event_detect(
+        self, pin: int, callback: Callable, bouncetime: int = None
+    ):
+        self.callbacks[pin].append(callback)
+        self.bouncetime[pin] = (bouncetime or 0) / 1000
+
+    def edge_time(self, pin: int) -> float:
+        return self.edge_at.get(pin, time.monotonic())
+
+    def inject(self, pin: int, value: int, at: float = None) -> bool:
+        """
+        Метод подающий фронт на вход.
+
+        Возвращает False, если фронт отброшен фильтром дребезга.
+        """
+        at = time.monotonic() if at is None else at
+        with self._lock:
+            if self.levels.get(pin) == value:
+                return False
+            self.levels[pin] = value
+            self.edges += 1
+            last = self.last_edge.get(pin)
+            if last is not None and at - last < self.bouncetime.get(pin, 0):
+                self.filtered += 1
+                return False
+            self.last_edge[pin] = at
+            self.edge_at[pin] = at
+        for callback in self.callbacks[pin]:
+            callback(pin)
+        return True
+
+    def press(
+        self,
+        pin: int,
+        bounces: int = 0,
+        bounce_gap: float = 0.001,
+        hold: float = 0.1,
+        at: float = None,
+    ) -> int:
+        """
+        Метод имитирующий нажатие кнопки с подтяжкой к питанию:
+        спад, bounces пар ложных фронтов, отпускание через hold сек.
+
+        Время виртуальное, поэтому метод не спит: без at нажатие
+        ставится после предыдущего с паузой hold после отпускания.
+        Возвращает число фронтов, прошедших фильтр.
+        """
+        if at is None:
+            at = max(time.monotonic(), self.clock)
+        self.clock = max(self.clock, at + 2 * hold)
+        passed = self.inject(pin, LOW, at)
+        for index in range(bounces):
+            offset = at + (2 * index + 1) * bounce_gap
+            passed += self.inject(pin, HIGH, offset)
+            passed += self.inject(pin, LOW, offset + bounce_gap)
+        passed += self.inject(pin, HIGH, at + hold)
+        return passed
+
+    def pulse_train(
+        self,
+        pin: int,
+        count: int,
+        rate: float,
+        bounces: int = 0,
+        realtime: bool = False,
+    ) -> int:
+        """
+        Метод подающий count нажатий с частотой rate в секунду.
+
+        При realtime=False время виртуальное и фронты подаются
+        так быстро, как успевают обработчики.
+        """
+        start = time.monotonic()
+        period = 1 / rate
+        passed = 0
+        for index in range(count):
+            at = start + index * period
+            if realtime:
+                time.sleep(max(0, at - time.monotonic()))
+            passed += self.press(
+                pin, bounces=bounces, hold=period / 2, at=at
+            )
+        return passed
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (
+        RPiGPIOBackend,
+        LGPIOBackend,
+        GPIOZeroBackend,
+        SimulatedBackend,
+    )
+}
+
+# порядок автоматического выбора бэкенда
+AUTO_ORDER = ("rpi", "lgpio", "gpiozero", "sim")
+
+backend = None
+
+
+def select_backend(name: str = None) -> PinBackend:
+    """
+    Метод выбирающий бэкенд пинов при старте.
+
+    Без имени берется переменная окружения RPI_GPIO_BACKEND, а если
+    она не задана - первый доступный бэкенд из AUTO_ORDER.
+    """
+    global backend
+    name = name or os.environ.get(BACKEND_ENV)
+    if name and name not in BACKENDS:
+        raise ValueError(f"Unknown GPIO backend {name}")
+    for candidate in (name,) if name else AUTO_ORDER:
+        try:
+            backend = BACKENDS[candidate]()
+        except (ImportError, RuntimeError, OSError) as e:
+            log.info(f"GPIO backend {candidate} is unavailable: {e}")
+            continue
+        log.info(f"GPIO backend: {backend.name}")
+        return backend
+    raise RuntimeError(f"GPIO backend {name} is unavailable")
+
+
+def get_backend() -> PinBackend:
+    """Метод возвращающий выбранный бэкенд, выбирая его при первом вызове."""
+    return backend or select_backend()
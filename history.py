@@ -0,0 +1,110 @@
+import json
+import asyncio
+from datetime import datetime
+
+import websockets
+
+from clients import clients
+from logger import get_logger
+
+
+log = get_logger("history")
+
+
+# число записей журнала в одной странице выдачи
+HISTORY_PAGE_SIZE = 500
+
+
+async def stream_logs(
+    start: datetime = None,
+    end: datetime = None,
+    command: str = None,
+    after_id: int = 0,
+    page_size: int = HISTORY_PAGE_SIZE,
+):
+    """
+    Асинхронный генератор страниц журнала.
+
+    Каждая страница читается в пуле потоков, поэтому выгрузка
+    истории не блокирует цикл событий и обработку кнопок,
+    а в памяти держится не больше одной страницы.
+    """
+    import db
+
+    loop = asyncio.get_running_loop()
+    while True:
+        page = await loop.run_in_executor(
+            None, db.logs_page, after_id, start, end, command, page_size
+        )
+        if not page:
+            return
+        yield page
+        after_id = page[-1][0]
+        if len(page) < page_size:
+            return
+
+
+def parse_request(message: str) -> dict:
+    """
+    Метод разбирающий запрос истории вида
+    'history:{"from": iso, "to": iso, "command": str, "after": id}'.
+    """
+    params = json.loads(message.partition(":")[2] or "{}")
+    return {
+        "start": (
+            datetime.fromisoformat(params["from"])
+            if params.get("from")
+            else None
+        ),
+        "end": (
+            datetime.fromisoformat(params["to"]) if params.get("to") else None
+        ),
+        "command": params.get("command"),
+        "after_id": int(params.get("after", 0)),
+    }
+
+
+async def send_history(websocket: websockets, message: str):
+    """
+    Метод отправляющий клиенту историю журнала по страницам.
+
+    Каждая страница - сообщение {"type": "history", "rows": [...]},
+    в конце отправляется {"type": "history_end", "last": id}, по которому
+    клиент может продолжить выгрузку запросом с "after".
+    Страницы идут через исходящую очередь клиента по одной: следующая
+    читается, когда предыдущая отправлена.
+    """
+    try:
+        request = parse_request(message)
+    except (ValueError, TypeError) as e:
+        clients.send({websocket}, f"Invalid history request: {e}")
+        return
+    last = request["after_id"]
+    try:
+        async for page in stream_logs(**request):
+            last = page[-1][0]
+            sent = await clients.send_when_idle(
+                websocket,
+                json.dumps(
+                    {
+                        "type": "history",
+                        "rows": [
+                            [row_id, dt.isoformat(), command]
+                            for row_id, dt, command in page
+                        ],
+                    },
+                    separators=(",", ":"),
+                ),
+            )
+            if not sent:
+                return
+    except Exception as e:
+        log.error(f"History request failed: {e}")
+        clients.send({websocket}, f"History request failed: {e}")
+        return
+    clients.send(
+        {websocket},
+        json.dumps(
+            {"type": "history_end", "last": last}, separators=(",", ":")
+        ),
+    )
@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import itertools
+from collections import deque
+from typing import Callable
+
+import websockets
+
+import metrics
+from clients import clients, EVENT, STATE
+from logger import get_logger
+
+
+log = get_logger("hub")
+
+
+# адрес хаба для платы, например ws://hub.local:8767
+HUB_URL_ENV = "RPI_HUB_URL"
+# идентификатор платы в общем потоке хаба
+BOARD_ID_ENV = "RPI_BOARD_ID"
+# режим запуска: board (по умолчанию) или hub
+MODE_ENV = "RPI_MODE"
+
+# порт, на котором хаб принимает платы и дашборды
+HUB_PORT = 8767
+# порт метрик хаба, чтобы хаб и плата на одном хосте не конфликтовали
+HUB_METRICS_PORT = 9109
+# число событий платы, хранимых на время разрыва связи с хабом
+UPLINK_BUFFER_SIZE = 1024
+# пределы паузы между попытками переподключения к хабу, сек
+RECONNECT_MIN, RECONNECT_MAX = 0.5, 30.0
+
+# путь подключения плат, дашборды подключаются к корню
+BOARD_PATH = "/board"
+# приветствие платы при подключении к хабу: board:<id>:<запуск>
+BOARD_HELLO = "board:"
+
+
+def dumps(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"))
+
+
+class Uplink:
+    """
+    Постоянное подключение платы к хабу.
+
+    События платы нумеруются и копятся в ограниченном буфере,
+    отправленные сообщения убираются из него только после отправки,
+    поэтому после разрыва плата досылает хвост, а хаб по номеру
+    отбрасывает уже принятые.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        board: str,
+        snapshot: Callable,
+        maxsize: int = UPLINK_BUFFER_SIZE,
+    ):
+        self.url = url.rstrip("/") + BOARD_PATH
+        self.board = board
+        self.snapshot = snapshot
+        self.buffer = deque(maxlen=maxsize)
+        self.ready = asyncio.Event()
+        self.connected = False
+        self.sequence = itertools.count(1)
+        self.boot = f"{os.getpid()}.{time.time():.0f}"
+        self.sent = 0
+        self.reconnects = 0
+
+    def push(self, message: dict):
+        """Метод ставящий событие платы в очередь отправки в хаб."""
+        message = {"seq": next(self.sequence), "time": time.time(), **message}
+        self.buffer.append(dumps(message))
+        self.ready.set()
+
+    async def run(self):
+        """Задача, поддерживающая подключение к хабу."""
+        delay = RECONNECT_MIN
+        while True:
+            try:
+                async with websockets.connect(self.url) as websocket:
+                    await websocket.send(
+                        f"{BOARD_HELLO}{self.board}:{self.boot}"
+                    )
+                    self.connected, delay = True, RECONNECT_MIN
+                    log.info(f"Connected to hub {self.url}")
+                    self.push({"type": "snapshot", **self.snapshot()})
+                    await self._send(websocket)
+            except (OSError, websockets.WebSocketException) as e:
+                log.info(f"Hub {self.url} unavailable: {e}")
+            self.connected = False
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    async def _send(self, websocket: websockets):
+        while True:
+            await self.ready.wait()
+            while self.buffer:
+                await websocket.send(self.buffer[0])
+                self.buffer.popleft()
+                self.sent += 1
+            self.ready.clear()
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "buffered": len(self.buffer),
+            "sent": self.sent,
+            "reconnects": self.reconnects,
+        }
+
+
+class Hub:
+    """
+    Хаб, сводящий события нескольких плат в один поток.
+
+    Каждое принятое событие получает сквозной номер хаба
+    и идентификатор платы и рассылается дашбордам через их
+    исходящие очереди. Новый дашборд получает последние
+    состояния всех плат одним снимком.
+    """
+
+    def __init__(self):
+        self.sequence = itertools.count(1)
+        self.boards = {}
+        self.states = {}
+        self.boots = {}
+        self.last_seq = {}
+        self.dashboards = set()
+        self.merged = 0
+        self.duplicates = 0
+
+    def snapshot(self) -> str:
+        return dumps({"type": "boards", "boards": self.states})
+
+    def send_snapshot(self, websocket: websockets):
+        clients.send({websocket}, self.snapshot(), STATE)
+
+    def accept(self, board: str, message: str):
+        """Метод принимающий событие платы и рассылающий его дашбордам."""
+        event = json.loads(message)
+        seq = event.get("seq", 0)
+        if event.get("type") == "snapshot":
+            self.states[board] = {
+                key: value
+                for key, value in event.items()
+                if key not in ("seq", "time", "type")
+            }
+        elif seq <= self.last_seq.get(board, 0):
+            self.duplicates += 1
+            return None
+        elif event.get("type") == "delta":
+            self.states.setdefault(board, {}).update(
+                (key, value)
+                for key, value in event.items()
+                if key not in ("seq", "time", "type", "version")
+            )
+        self.last_seq[board] = seq
+        self.merged += 1
+        event = {"hub_seq": next(self.sequence), "board": board, **event}
+        kind = EVENT if event.get("type") == "event" else STATE
+        clients.send(self.dashboards, dumps(event), kind)
+        return event
+
+    async def register(self, websocket: websockets):
+        """Обработчик подключений плат и дашбордов."""
+        try:
+            if websocket.path != BOARD_PATH:
+                return await self.serve_dashboard(websocket)
+            hello = await websocket.recv()
+            if not str(hello).startswith(BOARD_HELLO):
+                return await websocket.close(1008, "board hello expected")
+            board, _, boot = hello[len(BOARD_HELLO):].rpartition(":")
+            await self.serve_board(board, boot, websocket)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def serve_board(
+        self, board: str, boot: str, websocket: websockets
+    ):
+        log.info(f"Board {board} connected")
+        if self.boots.get(board) != boot:
+            # плата перезапущена и нумерует события заново
+            self.boots[board] = boot
+            self.last_seq.pop(board, None)
+        self.boards[board] = websocket
+        try:
+            async for message in websocket:
+                try:
+                    self.accept(board, message)
+                except (
+                    ValueError, TypeError, AttributeError, KeyError
+                ) as e:
+                    log.info(f"Bad event from {board}: {e}")
+        finally:
+            if self.boards.get(board) is websocket:
+                del self.boards[board]
+            log.info(f"Board {board} disconnected")
+
+    async def serve_dashboard(self, websocket: websockets):
+        self.dashboards.add(websocket)
+        clients.add(websocket, resync=self.send_snapshot)
+        metrics.CONNECTS.inc()
+        self.send_snapshot(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self.dashboards.discard(websocket)
+            clients.remove(websocket)
+
+    def stats(self) -> dict:
+        return {
+            "boards": sorted(self.boards),
+            "dashboards": len(self.dashboards),
+            "merged": self.merged,
+            "duplicates": self.duplicates,
+        }
+
+
+hub = Hub()
+
+metrics.registry.gauge(
+    "rpi_hub_boards", "Платы, подключенные к хабу", lambda: len(hub.boards)
+)
+
+
+def send_stats(stats: dict):
+    """Метод рассылающий статистику хаба дашбордам."""
+    if hub.dashboards:
+        clients.send(hub.dashboards, dumps({**stats, "hub": hub.stats()}))
+
+
+async def main(port: int = HUB_PORT):
+    """Инициализация хаба."""
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    loop.add_signal_handler(signal.SIGTERM, stop.set_result, None)
+    stats_task = asyncio.create_task(metrics.publish_stats(send_stats))
+    metrics_server = await metrics.serve(
+        port=metrics.metrics_port(HUB_METRICS_PORT)
+    )
+    async with websockets.serve(hub.register, port=port):
+        log.info(f"Hub served on {port}")
+        try:
+            await stop
+        finally:
+            if metrics_server is not None:
+                metrics_server.close()
+            stats_task.cancel()
+
+
+uplink = None
+
+
+def connect_uplink(snapshot: Callable):
+    """
+    Метод создающий подключение платы к хабу, если задан RPI_HUB_URL.
+
+    Возвращает задачу подключения или None.
+    """
+    global uplink
+    url = os.environ.get(HUB_URL_ENV)
+    if not url:
+        return None
+    board = os.environ.get(BOARD_ID_ENV) or os.uname().nodename
+    uplink = Uplink(url, board, snapshot)
+    return asyncio.create_task(uplink.run())
+
+
+def push(message: dict):
+    """Метод передающий событие платы в хаб, если плата к нему подключена."""
+    if uplink is not None:
+        uplink.push(message)
@@ -1,74 +1,250 @@
-import time
+import asyncio
+import threading
 
-from logger import log
+import hal
+import config
+import metrics
+from logger import get_logger
 
 
-try:
-    import RPi.GPIO as GPIO
-    IN_RPI = True
-    GPIO.setwarnings(False)
-    GPIO.setmode(GPIO.BCM)
-except ModuleNotFoundError:
-    log.info("No module")
-    pass
+log = get_logger('led')
 
 
 # порты светодиодов на плате
-START_LED, ACCEPT_LED, CANCEL_LED, READY_LED = 19, 13, 25, 16
+START_LED, ACCEPT_LED, CANCEL_LED, READY_LED = (
+    config.current.leds[name]
+    for name in ('start', 'accept', 'cancel', 'ready')
+)
 
 LEDS = {
-    19: 'START_LED',
-    13: 'ACCEPT_LED',
-    25: 'CANCEL_LED',
-    16: 'READY_LED',
+    START_LED: 'START_LED',
+    ACCEPT_LED: 'ACCEPT_LED',
+    CANCEL_LED: 'CANCEL_LED',
+    READY_LED: 'READY_LED',
 }
 
+# полупериод мигания светодиодов, сек
+BLINK_PERIOD = config.current.blink_period
+# доля периода мигания, в которую светодиод горит
+DUTY_CYCLE = config.current.duty_cycle
+
+# режимы мигания: аппаратный ШИМ/таймер бэкенда с программным
+# запасным вариантом или только общий программный тик
+BLINK_AUTO, BLINK_SOFTWARE = 'auto', 'software'
+
 
 class LED:
     """Абстрактный интерфейс для управления состоянием светодиодов."""
 
-    def __init__(self, port: int, on: bool = False):
+    def __init__(
+        self,
+        port: int,
+        on: bool = False,
+        blink_mode: str = BLINK_AUTO,
+        blink_period: float = 2 * BLINK_PERIOD,
+        duty_cycle: float = DUTY_CYCLE,
+    ):
         self.on = on
         self.port = port
-        self.init_led_gpio(port)
+        self.blink_mode = blink_mode
+        self.blink_period = blink_period
+        self.duty_cycle = duty_cycle
 
     @staticmethod
     def init_led_gpio(port: int):
-        """Инициализируем светодиоды."""
-        # GPIO.setup(port, GPIO.OUT)
+        """
+        Инициализируем светодиоды выключенными.
 
-        """Выключаем светодиоды при инициализации."""
-        # GPIO.output(port, GPIO.LOW)
+        Вызывается при настройке платы, а не при создании объекта,
+        поэтому импорт модуля не выбирает бэкенд GPIO.
+        """
+        hal.get_backend().setup_output(port, hal.LOW)
 
     def turn_on(self):
         """Метод включающий светодиод."""
-        # GPIO.output(self.port, GPIO.HIGH)
+        hal.get_backend().write(self.port, hal.HIGH)
         self.on = True
+        metrics.LED_TRANSITIONS.inc()
         log.info(f'LED on {LEDS[self.port]} is ON!')
 
     def turn_off(self):
         """Метод выключающий светодиод."""
-        # GPIO.output(self.port, GPIO.LOW)
+        hal.get_backend().write(self.port, hal.LOW)
         self.on = False
+        metrics.LED_TRANSITIONS.inc()
         log.info(f'LED on {LEDS[self.port]} is OFF!')
 
-    def blinking_algorithm(self):
-        self.turn_on()
-        time.sleep(0.75)
-        self.turn_off()
-        time.sleep(0.75)
-
-    def _blinking(self, event):
-        while not event.is_set():
-            self.blinking_algorithm()
-
     def blinking(self, *args, **kwargs):
         """Метод заставляющий светодиод мигать."""
+        return blinker.start(self)
+
+
+class BlinkHandle:
+    """Дескриптор мигающего светодиода."""
+
+    def __init__(self, scheduler, led: LED):
+        self.scheduler = scheduler
+        self.led = led
+
+    def __repr__(self):
+        return f'BlinkHandle({LEDS[self.led.port]})'
+
+    def stop(self):
+        """Метод прекращающий мигание светодиода."""
+        self.scheduler.stop(self.led)
+
+    cancel = stop
+
+    def done(self) -> bool:
+        return not self.scheduler.is_blinking(self.led)
+
+
+class BlinkScheduler:
+    """
+    Планировщик мигания светодиодов.
+
+    Если бэкенд умеет мигать сам (аппаратный ШИМ или таймер),
+    мигание отдается ему с периодом и скважностью светодиода.
+    Остальные светодиоды переключаются общим тиком в цикле событий
+    с полупериодом period и скважностью 50%.
+    """
+
+    def __init__(self, period: float = BLINK_PERIOD):
+        self.period = period
+        self.phase = False
+        self._leds = {}
+        self._hardware = {}
+        self._lock = threading.Lock()
+
+    def start(self, led: LED) -> BlinkHandle:
+        """Метод добавляющий светодиод в мигание."""
+        with self._lock:
+            if led.blink_mode == BLINK_AUTO and hal.get_backend().start_blink(
+                led.port, led.blink_period, led.duty_cycle
+            ):
+                self._hardware[led.port] = led
+                led.on = True
+            else:
+                self._leds[led.port] = led
+                led.turn_on() if self.phase else led.turn_off()
+        return BlinkHandle(self, led)
+
+    def stop(self, led: LED):
+        """Метод убирающий светодиод из мигания и выключающий его."""
+        with self._lock:
+            if self._hardware.pop(led.port, None) is not None:
+                hal.get_backend().stop_blink(led.port)
+                led.turn_off()
+            elif self._leds.pop(led.port, None) is not None:
+                led.turn_off()
+
+    def stop_all(self):
+        """Метод прекращающий мигание всех светодиодов."""
+        with self._lock:
+            leds, self._leds = self._leds, {}
+            hardware, self._hardware = self._hardware, {}
+            for led in hardware.values():
+                hal.get_backend().stop_blink(led.port)
+            for led in [*leds.values(), *hardware.values()]:
+                led.turn_off()
+
+    def is_blinking(self, led: LED) -> bool:
+        return led.port in self._leds or led.port in self._hardware
+
+    def tick(self):
+        """Метод переключающий все мигающие светодиоды одной записью."""
+        with self._lock:
+            self.phase = not self.phase
+            if not self._leds:
+                return
+            level = hal.HIGH if self.phase else hal.LOW
+            hal.get_backend().write_many(
+                {port: level for port in self._leds}
+            )
+            for led in self._leds.values():
+                led.on = self.phase
+
+    async def run(self):
+        """Задача цикла событий, тикающая без накопления дрейфа."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
         while True:
-            self.blinking_algorithm()
+            deadline = max(deadline + self.period, loop.time())
+            await asyncio.sleep(deadline - loop.time())
+            self.tick()
+
+
+blinker = BlinkScheduler()
 
 
 ready_led = LED(port=READY_LED, on=False)
 accept_led = LED(port=ACCEPT_LED, on=False)
 start_led = LED(port=START_LED, on=False)
 cancel_led = LED(port=CANCEL_LED, on=False)
+
+# порядок светодиодов в битовой маске состояния панели
+PANEL_LEDS = [ready_led, accept_led, start_led, cancel_led]
+
+
+def setup_leds(leds: list = PANEL_LEDS):
+    """Метод настраивающий выходы светодиодов панели."""
+    for led in leds:
+        led.init_led_gpio(led.port)
+        led.on = False
+
+
+class LEDBank:
+    """
+    Группа светодиодов, переключаемая целиком по битовой маске.
+
+    Изменившиеся пины записываются одной пакетной записью,
+    пины в нужном состоянии пропускаются.
+    """
+
+    def __init__(self, leds: list):
+        self.leds = leds
+
+    def bitmap(self) -> int:
+        """Метод возвращающий маску включенных светодиодов."""
+        return sum(1 << index for index, led in enumerate(self.leds) if led.on)
+
+    def apply(self, target: int) -> int:
+        """Метод приводящий светодиоды к маске, возвращает маску изменений."""
+        before = self.bitmap()
+        changed = before ^ target
+        if not changed:
+            return 0
+        values = {}
+        for index, led in enumerate(self.leds):
+            if changed & 1 << index:
+                led.on = bool(target & 1 << index)
+                values[led.port] = hal.HIGH if led.on else hal.LOW
+        hal.get_backend().write_many(values)
+        metrics.LED_TRANSITIONS.inc(amount=len(values))
+        log.info(f'LEDs {before:04b} -> {target:04b}')
+        return changed
+
+    def off(self) -> int:
+        """Метод выключающий все светодиоды группы."""
+        return self.apply(0)
+
+
+bank = LEDBank(PANEL_LEDS)
+
+
+def leds_bitmap() -> int:
+    """Метод возвращающий битовую маску горящих (не мигающих) светодиодов."""
+    return sum(
+        1 << index
+        for index, led in enumerate(PANEL_LEDS)
+        if led.on and not blinker.is_blinking(led)
+    )
+
+
+def blink_bitmap() -> int:
+    """Метод возвращающий битовую маску мигающих светодиодов."""
+    return sum(
+        1 << index
+        for index, led in enumerate(PANEL_LEDS)
+        if blinker.is_blinking(led)
+    )
@@ -1,15 +1,112 @@
+import os
+import json
+import time
+import queue
+import atexit
 import logging
+import logging.handlers
+
+
+# уровни подсистем вида "led=WARNING,db=DEBUG"
+LEVELS_ENV = "RPI_LOG_LEVELS"
+# формат вывода: json или text
+FORMAT_ENV = "RPI_LOG_FORMAT"
+
+# повторяющиеся сообщения подсистем: не больше burst за interval сек
+RATE_LIMITS = {"led": (4, 10.0)}
+
+
+class JSONFormatter(logging.Formatter):
+    """Форматтер, выводящий запись одной JSON-строкой."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "subsystem": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.thread,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "suppressed", 0):
+            data["suppressed"] = record.suppressed
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Фильтр повторяющихся сообщений.
+
+    Одинаковый текст пропускается не чаще burst раз за interval сек,
+    число отброшенных повторов добавляется к следующей записи.
+    """
+
+    def __init__(self, burst: int, interval: float):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = record.msg
+        now = time.monotonic()
+        started, count, suppressed = self.windows.get(key, (now, 0, 0))
+        if now - started >= self.interval:
+            started, count = now, 0
+        if count >= self.burst:
+            self.windows[key] = (started, count, suppressed + 1)
+            return False
+        record.suppressed = suppressed
+        self.windows[key] = (started, count + 1, 0)
+        return True
+
+
+def _levels(spec: str) -> dict:
+    levels = {}
+    for item in filter(None, spec.split(",")):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
 
 
 """Инициализация логера."""
-log = logging.getLogger(__name__)
+log = logging.getLogger("rpi")
 log.setLevel(logging.INFO)
-handler = logging.StreamHandler()
+log.propagate = False
 
 """Настройка вывода логов."""
-formatter = logging.Formatter(
-    '%(name)s - %(asctime)s - %(module)s - %(lineno)d'
-    ' - %(process)d - %(thread)d - %(message)s'
-)
+if os.environ.get(FORMAT_ENV, "json") == "text":
+    formatter = logging.Formatter(
+        '%(name)s - %(asctime)s - %(module)s - %(lineno)d'
+        ' - %(process)d - %(thread)d - %(message)s'
+    )
+else:
+    formatter = JSONFormatter()
+handler = logging.StreamHandler()
 handler.setFormatter(formatter)
-log.addHandler(handler)
+
+"""
+Запись в поток вывода выполняет отдельный поток слушателя,
+обработчики кнопок и цикл событий только кладут запись в очередь.
+"""
+records = queue.SimpleQueue()
+log.addHandler(logging.handlers.QueueHandler(records))
+listener = logging.handlers.QueueListener(records, handler)
+listener.start()
+atexit.register(listener.stop)
+
+SUBSYSTEM_LEVELS = _levels(os.environ.get(LEVELS_ENV, ""))
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """Метод возвращающий логер подсистемы со своим уровнем."""
+    logger = log.getChild(subsystem)
+    if subsystem in SUBSYSTEM_LEVELS:
+        logger.setLevel(SUBSYSTEM_LEVELS[subsystem])
+    if subsystem in RATE_LIMITS and not logger.filters:
+        logger.addFilter(RateLimitFilter(*RATE_LIMITS[subsystem]))
+    return logger
@@ -0,0 +1,232 @@
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from typing import Callable
+
+from logger import get_logger
+
+
+log = get_logger("metrics")
+
+
+# адрес локальной точки сбора метрик в формате Prometheus,
+# порт переопределяется переменной RPI_METRICS_PORT
+METRICS_HOST, METRICS_PORT = "127.0.0.1", 9108
+METRICS_PORT_ENV = "RPI_METRICS_PORT"
+# период рассылки статистики подписанным клиентам, сек
+STATS_INTERVAL = 10
+
+# границы корзин гистограмм задержек, сек
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Монотонный счетчик, в том числе с метками."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {} if labels else {(): 0}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels) -> float:
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name + _labels(self.labels, labels), value
+
+
+class Gauge:
+    """Текущее значение, вычисляемое функцией в момент сбора."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, function: Callable):
+        self.name = name
+        self.description = description
+        self.function = function
+
+    def get(self) -> float:
+        return self.function()
+
+    def samples(self):
+        yield self.name, self.function()
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, description: str, buckets: tuple = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield f'{self.name}_bucket{{le="{bound}"}}', total
+        yield f'{self.name}_bucket{{le="+Inf"}}', self.count
+        yield f"{self.name}_sum", self.sum
+        yield f"{self.name}_count", self.count
+
+
+class Registry:
+    """Реестр метрик процесса."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labels: tuple = ()):
+        return self.add(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, function: Callable):
+        return self.add(Gauge(name, description, function))
+
+    def histogram(self, name: str, description: str, **kwargs):
+        return self.add(Histogram(name, description, **kwargs))
+
+    def render(self) -> str:
+        """Метод формирующий текст в формате экспозиции Prometheus."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {value}" for name, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Метод возвращающий значения метрик для сообщения статистики."""
+        return {
+            name: value
+            for metric in self.metrics.values()
+            if metric.kind != "histogram"
+            for name, value in metric.samples()
+        } | {
+            f"{metric.name}_avg": (
+                metric.sum / metric.count if metric.count else 0.0
+            )
+            for metric in self.metrics.values()
+            if metric.kind == "histogram"
+        }
+
+
+registry = Registry()
+
+PRESSES = registry.counter(
+    "rpi_button_presses_total", "Принятые нажатия кнопок", ("command",)
+)
+REJECTED = registry.counter(
+    "rpi_button_rejected_total",
+    "Нажатия не по порядку (InvalidButton)",
+    ("command",),
+)
+ERRORS = registry.counter("rpi_handler_errors_total", "Ошибки обработчиков")
+BROADCASTS = registry.counter("rpi_broadcasts_total", "Рассылки по вебсокетам")
+CONNECTS = registry.counter(
+    "rpi_ws_connections_total", "Принятые вебсокет подключения"
+)
+LED_TRANSITIONS = registry.counter(
+    "rpi_led_transitions_total", "Переключения светодиодов"
+)
+DB_ROWS = registry.counter(
+    "rpi_db_rows_written_total", "Сохраненные записи журнала"
+)
+DB_BATCH_SECONDS = registry.histogram(
+    "rpi_db_batch_seconds", "Время сохранения пачки записей журнала"
+)
+CLIENT_DROPPED = registry.counter(
+    "rpi_ws_client_dropped_total",
+    "Сообщения, выброшенные из очередей медленных клиентов",
+    ("policy",),
+)
+TASKS_LEAKED = registry.counter(
+    "rpi_tasks_leaked_total",
+    "Задачи сценария, не завершившиеся после отмены",
+)
+EVENTS_DROPPED = registry.counter(
+    "rpi_events_dropped_total", "События GPIO, не поместившиеся в очередь"
+)
+EVENT_LATENCY = registry.histogram(
+    "rpi_event_latency_seconds", "Задержка от события GPIO до рассылки"
+)
+
+
+async def handle_scrape(reader, writer):
+    """Обработчик HTTP запроса сбора метрик."""
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = registry.render().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\n".encode()
+            + b"Connection: close\r\n\r\n"
+            + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def metrics_port(default: int = METRICS_PORT) -> int:
+    """Метод возвращающий порт метрик из RPI_METRICS_PORT или default."""
+    return int(os.environ.get(METRICS_PORT_ENV, default))
+
+
+async def serve(host: str = METRICS_HOST, port: int = None):
+    """
+    Метод запускающий локальную точку сбора метрик.
+
+    Если порт занят, ошибка пишется в лог и возвращается None:
+    панель продолжает работать без метрик.
+    """
+    port = metrics_port() if port is None else port
+    try:
+        server = await asyncio.start_server(handle_scrape, host, port)
+    except OSError as e:
+        log.error(f"Metrics are not served on {host}:{port}: {e}")
+        return None
+    log.info(f"Metrics served on {host}:{port}")
+    return server
+
+
+async def publish_stats(send: Callable, interval: float = STATS_INTERVAL):
+    """Задача, периодически передающая снимок метрик в send."""
+    while True:
+        await asyncio.sleep(interval)
+        send({"type": "stats", "time": time.time(), **registry.snapshot()})
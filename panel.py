@@ -0,0 +1,69 @@
+from collections import deque
+
+from scenario import IDLE
+
+
+# поля состояния панели в порядке упаковки
+FIELDS = ("state", "leds", "blink", "buttons", "timeout")
+
+# число последних изменений, доступных для досинхронизации
+PANEL_HISTORY = 64
+
+
+class PanelState:
+    """
+    Версионированное состояние панели: этап сценария,
+    горящие и мигающие светодиоды, последние нажатые кнопки
+    и остаток срока автоотключения в целых секундах.
+
+    Мигание хранится маской, поэтому тики мигания
+    не меняют состояние и не рассылаются.
+    """
+
+    def __init__(self, history: int = PANEL_HISTORY):
+        self.version = 0
+        self.values = {
+            "state": IDLE,
+            "leds": 0,
+            "blink": 0,
+            "buttons": 0,
+            "timeout": 0,
+        }
+        self.history = deque(maxlen=history)
+
+    def update(self, **values) -> dict:
+        """Метод применяющий значения и возвращающий изменившиеся поля."""
+        delta = {
+            key: value
+            for key, value in values.items()
+            if self.values[key] != value
+        }
+        if delta:
+            self.version += 1
+            self.values.update(delta)
+            self.history.append((self.version, delta))
+        return delta
+
+    def snapshot(self) -> dict:
+        """Метод возвращающий полное состояние."""
+        return dict(self.values)
+
+    def since(self, version: int):
+        """
+        Метод возвращающий изменения после версии version.
+
+        Возвращает None, если история уже не содержит нужных изменений
+        и клиенту нужен полный снимок.
+        """
+        if version == self.version:
+            return []
+        if (
+            version > self.version
+            or not self.history
+            or self.history[0][0] > version + 1
+        ):
+            return None
+        return [item for item in self.history if item[0] > version]
+
+
+panel = PanelState()
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import struct
+import itertools
+
+from panel import FIELDS
+from scenario import IDLE, ARMED, READY, ACCEPTED, STARTED
+
+
+# версия бинарного протокола
+PROTOCOL_VERSION = 2
+
+# режимы подключения
+TEXT, BINARY = "text", "binary"
+
+# коды операций
+OP_HELLO, OP_COMMAND, OP_REJECTED, OP_ERROR = 0, 1, 2, 3
+OP_SNAPSHOT, OP_DELTA = 4, 5
+
+# коды команд, коды 1-6 совпадают с номером бита кнопки
+COMMAND_CODES = {
+    "wave pressed": 1,
+    "sim pressed": 2,
+    "ready pressed": 3,
+    "accept pressed": 4,
+    "start pressed": 5,
+    "cancel pressed": 6,
+    "ready": 7,
+    "cancel": 8,
+    "timeout": 9,
+}
+COMMANDS = {code: command for command, code in COMMAND_CODES.items()}
+BUTTONS_COUNT = 6
+
+STATE_CODES = {IDLE: 0, ARMED: 1, READY: 2, ACCEPTED: 3, STARTED: 4}
+STATES = {code: state for state, code in STATE_CODES.items()}
+
+# заголовок: версия, код операции, номер сообщения
+HEADER = struct.Struct("!BBI")
+# тело: команда, состояние сценария, битовые маски светодиодов и кнопок
+BODY = struct.Struct("!BBBB")
+FRAME_SIZE = HEADER.size + BODY.size
+# снимок: версия состояния и все поля панели
+SNAPSHOT = struct.Struct("!I" + "B" * len(FIELDS))
+# изменение: версия состояния и маска изменившихся полей,
+# за которыми следуют их значения по одному байту
+DELTA = struct.Struct("!IB")
+
+sequence = itertools.count(1)
+# последний выданный номер сообщения
+last_seq = 0
+# идентификатор запуска: после перезапуска нумерация начинается заново
+BOOT = f"{os.getpid()}.{time.time():.0f}"
+
+
+def next_seq() -> int:
+    """Метод возвращающий номер следующего сообщения."""
+    global last_seq
+    last_seq = next(sequence) & 0xFFFFFFFF
+    return last_seq
+
+
+def buttons_bitmap(command: str) -> int:
+    """Метод возвращающий маску кнопки, вызвавшей команду."""
+    code = COMMAND_CODES.get(command, 0)
+    return 1 << (code - 1) if 0 < code <= BUTTONS_COUNT else 0
+
+
+def encode(
+    opcode: int,
+    seq: int,
+    command: str = None,
+    state: str = IDLE,
+    leds: int = 0,
+    text: str = None,
+) -> bytes:
+    """Метод упаковывающий сообщение в бинарный кадр."""
+    frame = HEADER.pack(PROTOCOL_VERSION, opcode, seq) + BODY.pack(
+        COMMAND_CODES.get(command, 0),
+        STATE_CODES.get(state, 0),
+        leds,
+        buttons_bitmap(command),
+    )
+    if text:
+        frame += text.encode()
+    return frame
+
+
+def decode(frame: bytes) -> dict:
+    """Метод распаковывающий бинарный кадр."""
+    if len(frame) < FRAME_SIZE:
+        raise ValueError("Frame is too short")
+    version, opcode, seq = HEADER.unpack_from(frame)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported protocol version {version}")
+    command, state, leds, buttons = BODY.unpack_from(frame, HEADER.size)
+    return {
+        "opcode": opcode,
+        "seq": seq,
+        "command": COMMANDS.get(command),
+        "state": STATES.get(state),
+        "leds": leds,
+        "buttons": buttons,
+        "text": frame[FRAME_SIZE:].decode() or None,
+    }
+
+
+def _pack_field(field: str, value) -> int:
+    return STATE_CODES[value] if field == "state" else value
+
+
+def _unpack_field(field: str, value: int):
+    return STATES.get(value) if field == "state" else value
+
+
+def encode_state(opcode: int, seq: int, version: int, values: dict) -> bytes:
+    """Метод упаковывающий снимок или изменение состояния панели."""
+    header = HEADER.pack(PROTOCOL_VERSION, opcode, seq)
+    if opcode == OP_SNAPSHOT:
+        return header + SNAPSHOT.pack(
+            version,
+            *(_pack_field(field, values[field]) for field in FIELDS),
+        )
+    mask, changed = 0, []
+    for index, field in enumerate(FIELDS):
+        if field in values:
+            mask |= 1 << index
+            changed.append(_pack_field(field, values[field]))
+    return header + DELTA.pack(version, mask) + bytes(changed)
+
+
+def decode_state(frame: bytes) -> dict:
+    """Метод распаковывающий снимок или изменение состояния панели."""
+    version, opcode, seq = HEADER.unpack_from(frame)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported protocol version {version}")
+    if opcode == OP_SNAPSHOT:
+        version, *values = SNAPSHOT.unpack_from(frame, HEADER.size)
+        fields = FIELDS
+    else:
+        version, mask = DELTA.unpack_from(frame, HEADER.size)
+        fields = [
+            field for index, field in enumerate(FIELDS) if mask & 1 << index
+        ]
+        values = frame[HEADER.size + DELTA.size:]
+    return {
+        "opcode": opcode,
+        "seq": seq,
+        "version": version,
+        "values": {
+            field: _unpack_field(field, value)
+            for field, value in zip(fields, values)
+        },
+    }
+
+
+def state_text(opcode: int, version: int, values: dict) -> str:
+    """Метод сериализующий состояние панели для текстовых клиентов."""
+    return json.dumps(
+        {
+            "type": "snapshot" if opcode == OP_SNAPSHOT else "delta",
+            "version": version,
+            **values,
+        },
+        separators=(",", ":"),
+    )
+
+
+def negotiate(message: str):
+    """
+    Метод разбирающий запрос режима вида 'protocol:binary:2'.
+
+    Возвращает режим или None, если сообщение не является запросом.
+    """
+    parts = message.split(":")
+    if len(parts) < 2 or parts[0] != "protocol":
+        return None
+    if parts[1] == TEXT:
+        return TEXT
+    if parts[1] == BINARY and (
+        len(parts) < 3 or parts[2] == str(PROTOCOL_VERSION)
+    ):
+        return BINARY
+    raise ValueError(f"Unsupported protocol {':'.join(parts[1:])}")
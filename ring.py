@@ -0,0 +1,113 @@
+import os
+import time
+from array import array
+from bisect import bisect_right
+
+import metrics
+
+
+# число последних событий в памяти, переопределяется RPI_EVENT_RING
+RING_CAPACITY_ENV = "RPI_EVENT_RING"
+RING_CAPACITY = 1024
+
+# байт на событие в массивах: номер, время, код операции,
+# команда, состояние сценария и маска светодиодов
+EVENT_SIZE = 4 + 8 + 4
+
+
+class EventRing:
+    """
+    Кольцевой буфер последних рассылок с заранее выделенной памятью.
+
+    Поля событий хранятся в массивах фиксированного размера,
+    отдельный текст держится только для сообщений, текст которых
+    не совпадает с командой (отказы и ошибки), поэтому объем памяти
+    ограничен capacity * EVENT_SIZE байт и ссылками на эти тексты.
+    """
+
+    def __init__(self, capacity: int = RING_CAPACITY):
+        self.capacity = capacity
+        self.seqs = array("I", bytes(4 * capacity))
+        self.times = array("d", bytes(8 * capacity))
+        self.codes = array("B", bytes(4 * capacity))
+        self.texts = [None] * capacity
+        self.count = 0
+        self.evicted_seq = None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(
+        self,
+        seq: int,
+        opcode: int,
+        command: int,
+        state: int,
+        leds: int,
+        text: str = None,
+    ):
+        """Метод добавляющий событие, вытесняя самое старое."""
+        index = self.count % self.capacity
+        if self.count >= self.capacity:
+            self.evicted_seq = self.seqs[index]
+        self.seqs[index] = seq
+        self.times[index] = time.time()
+        self.codes[4 * index:4 * index + 4] = array(
+            "B", (opcode, command, state, leds)
+        )
+        self.texts[index] = text
+        self.count += 1
+
+    def newest(self) -> int:
+        """Метод возвращающий номер последнего события или 0."""
+        return self.seqs[(self.count - 1) % self.capacity] if self.count else 0
+
+    def since(self, seq: int, latest: int = None) -> tuple[bool, list]:
+        """
+        Метод возвращающий события с номером больше seq.
+
+        Первый элемент ответа - признак того, что часть событий
+        после seq уже вытеснена и клиенту нужен полный снимок.
+        Номер больше latest (по умолчанию - последнего события)
+        выдан до перезапуска сервера и тоже считается разрывом.
+        События - кортежи (seq, time, opcode, command, state, leds, text).
+        """
+        latest = self.newest() if latest is None else latest
+        if seq > latest:
+            return True, []
+        first = self.count - len(self)
+        start = bisect_right(
+            range(first, self.count),
+            seq,
+            key=lambda i: self.seqs[i % self.capacity],
+        )
+        gap = self.evicted_seq is not None and seq < self.evicted_seq
+        return gap, [self[first + i] for i in range(start, len(self))]
+
+    def __getitem__(self, position: int) -> tuple:
+        index = position % self.capacity
+        return (
+            self.seqs[index],
+            self.times[index],
+            *self.codes[4 * index:4 * index + 4],
+            self.texts[index],
+        )
+
+    def nbytes(self) -> int:
+        """Метод возвращающий объем памяти массивов буфера."""
+        return self.capacity * EVENT_SIZE
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "size": len(self),
+            "bytes": self.nbytes(),
+            "evicted_seq": self.evicted_seq,
+        }
+
+
+events = EventRing(int(os.environ.get(RING_CAPACITY_ENV, RING_CAPACITY)))
+
+metrics.registry.gauge(
+    "rpi_event_ring_size", "События в кольцевом буфере", lambda: len(events)
+)
@@ -0,0 +1,104 @@
+import time
+import threading
+from collections import defaultdict
+from typing import Callable
+
+import exceptions
+from logger import get_logger
+
+
+log = get_logger("scenario")
+
+
+# состояния сценария
+IDLE, ARMED, READY, ACCEPTED, STARTED = (
+    "idle",
+    "armed",
+    "ready",
+    "accepted",
+    "started",
+)
+
+# события, которые не привязаны к текущему состоянию
+ANY_STATE = None
+
+# таблица переходов: (состояние, событие) -> новое состояние
+TRANSITIONS = {
+    (IDLE, "ready"): ARMED,
+    (ARMED, "ready pressed"): READY,
+    (READY, "accept pressed"): ACCEPTED,
+    (ACCEPTED, "start pressed"): STARTED,
+    (STARTED, "cancel pressed"): IDLE,
+    (STARTED, "timeout"): IDLE,
+    (ANY_STATE, "cancel"): IDLE,
+}
+
+
+class Scenario:
+    """
+    Конечный автомат сценария ready -> accept -> start -> cancel.
+
+    Проверка перехода - один поиск в словаре, переходы атомарны
+    для потоков GPIO и обработчиков вебсокетов.
+    """
+
+    def __init__(self, transitions: dict, initial: str = IDLE):
+        self.transitions = transitions
+        self.state = initial
+        self.entered = {initial: time.time()}
+        self.hooks = defaultdict(list)
+        self.lock = threading.RLock()
+
+    def on(self, event: str, hook: Callable):
+        """Метод регистрирующий действие при переходе по событию."""
+        self.hooks[event].append(hook)
+        return hook
+
+    def target(self, event: str):
+        """Метод возвращающий состояние после события или None."""
+        return self.transitions.get(
+            (self.state, event), self.transitions.get((ANY_STATE, event))
+        )
+
+    def can(self, event: str) -> bool:
+        """Метод проверяющий допустимость события."""
+        return self.target(event) is not None
+
+    def fire(self, event: str, at: float = None) -> str:
+        """
+        Метод выполняющий переход по событию.
+
+        При восстановлении из журнала at - время события.
+        """
+        with self.lock:
+            target = self.target(event)
+            if target is None:
+                log.info(f"{event} is unavailable in {self.state}")
+                raise exceptions.InvalidButton(
+                    "Button pressed in wrong order"
+                )
+            log.info(f"{self.state} -> {target} by {event}")
+            self.state = target
+            self.entered[target] = at or time.time()
+            for hook in self.hooks[event]:
+                hook()
+            return target
+
+    def boundaries(self) -> tuple:
+        """
+        Метод возвращающий события, завершающие сценарий:
+        с них начинается восстановление из журнала.
+        """
+        return tuple(
+            event
+            for (_, event), target in self.transitions.items()
+            if target == IDLE
+        )
+
+    def since(self, state: str = None) -> float:
+        """Метод возвращающий время в секундах с момента входа в состояние."""
+        entered = self.entered.get(state or self.state)
+        return None if entered is None else time.time() - entered
+
+
+machine = Scenario(TRANSITIONS)
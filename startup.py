@@ -0,0 +1,70 @@
+import os
+import time
+from contextlib import contextmanager
+
+from logger import get_logger
+
+
+log = get_logger("startup")
+
+
+# включение профиля запуска: RPI_STARTUP_PROFILE=1
+PROFILE_ENV = "RPI_STARTUP_PROFILE"
+
+
+def process_age() -> float:
+    """
+    Метод возвращающий время с запуска процесса, сек.
+
+    Читается из /proc, поэтому учитывает старт интерпретатора
+    и импорты до первой отметки. Вне Linux возвращает 0.
+    """
+    try:
+        with open("/proc/self/stat") as stat:
+            started = int(stat.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as uptime:
+            now = float(uptime.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return max(now - started / os.sysconf("SC_CLK_TCK"), 0.0)
+
+
+class StartupProfile:
+    """
+    Профиль запуска сервера: отметки от старта процесса
+    и длительности этапов инициализации в миллисекундах.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.origin = time.perf_counter() - (
+            process_age() if enabled else 0.0
+        )
+        self.marks = {}
+        self.phases = {}
+
+    def mark(self, name: str) -> float:
+        """Метод запоминающий момент от старта процесса, мс."""
+        elapsed = (time.perf_counter() - self.origin) * 1000
+        self.marks[name] = round(elapsed, 1)
+        return elapsed
+
+    @contextmanager
+    def phase(self, name: str):
+        """Контекстный менеджер, измеряющий длительность этапа."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.phases[name] = round(elapsed, 1)
+
+    def report(self) -> dict:
+        """Метод выводящий профиль в лог, если он включен."""
+        report = {"marks": self.marks, "phases": self.phases}
+        if self.enabled:
+            log.info(f"Startup profile {report}")
+        return report
+
+
+profile = StartupProfile(os.environ.get(PROFILE_ENV) == "1")
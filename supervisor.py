@@ -0,0 +1,144 @@
+import time
+import threading
+from typing import Callable
+
+import metrics
+from logger import get_logger
+
+
+log = get_logger("supervisor")
+
+
+# время на завершение отмененной задачи, после которого она утекла, сек
+CANCEL_GRACE = 1.0
+
+
+def is_done(handle) -> bool:
+    """
+    Метод проверяющий, завершилась ли задача.
+
+    Понимает задачи asyncio, потоки и таймеры threading
+    и дескрипторы мигания светодиодов.
+    """
+    if hasattr(handle, "done"):
+        return handle.done()
+    if hasattr(handle, "is_alive"):
+        return not handle.is_alive()
+    return True
+
+
+class Supervised:
+    """Дескриптор задачи сценария под надзором."""
+
+    def __init__(self, name: str, handle):
+        self.name = name
+        self.handle = handle
+        self.started = time.monotonic()
+        self.cancelled = None
+
+    def __repr__(self):
+        return repr(self.handle)
+
+    def cancel(self):
+        """Метод отменяющий задачу без ожидания ее завершения."""
+        if self.cancelled is None:
+            self.cancelled = time.monotonic()
+            self.handle.cancel()
+
+    def join(self, timeout: float):
+        """Метод дожидающийся завершения потока задачи."""
+        if isinstance(self.handle, threading.Thread) and (
+            self.handle is not threading.current_thread()
+        ):
+            self.handle.join(timeout)
+
+    def done(self) -> bool:
+        return is_done(self.handle)
+
+
+class Supervisor:
+    """
+    Владелец побочных задач сценария: мигания, таймеров отключения.
+
+    Задачи отменяются штатно через cancel, завершившиеся убираются
+    из списка, а отмененные, но не завершившиеся за grace сек,
+    считаются утекшими и учитываются в метриках.
+    """
+
+    def __init__(self, grace: float = CANCEL_GRACE):
+        self.grace = grace
+        self.active = []
+        self.cancelling = []
+        self.spawned = 0
+        self.reaped = 0
+        self.leaked = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.active)
+
+    def spawn(self, command: Callable, *args, **kwargs):
+        """Метод запускающий задачу и берущий ее под надзор."""
+        handle = command(*args, **kwargs)
+        if handle is None:
+            return None
+        task = Supervised(getattr(command, "__name__", repr(command)), handle)
+        with self._lock:
+            self.active.append(task)
+            self.spawned += 1
+        self.reap()
+        return task
+
+    def cancel(self, tasks: list = None):
+        """
+        Метод отменяющий задачи сценария, по умолчанию все активные.
+        """
+        with self._lock:
+            if tasks is None:
+                tasks, self.active = self.active, []
+            else:
+                self.active = [t for t in self.active if t not in tasks]
+            for task in tasks:
+                task.cancel()
+                task.join(self.grace)
+                log.info(f"{task} stopped!")
+            self.cancelling.extend(tasks)
+        self.reap()
+
+    def reap(self) -> int:
+        """Метод убирающий завершенные задачи, возвращает число утекших."""
+        now = time.monotonic()
+        with self._lock:
+            self.active = [t for t in self.active if not t.done()]
+            pending = []
+            for task in self.cancelling:
+                if task.done():
+                    self.reaped += 1
+                elif now - task.cancelled >= self.grace:
+                    self.leaked += 1
+                    metrics.TASKS_LEAKED.inc()
+                    log.warning(f"{task} did not stop after cancel")
+                else:
+                    pending.append(task)
+            self.cancelling = pending
+        return self.leaked
+
+    def stats(self) -> dict:
+        """Метод возвращающий счетчики задач."""
+        with self._lock:
+            return {
+                "active": len(self.active),
+                "cancelling": len(self.cancelling),
+                "spawned": self.spawned,
+                "reaped": self.reaped,
+                "leaked": self.leaked,
+            }
+
+
+supervisor = Supervisor()
+
+metrics.registry.gauge(
+    "rpi_supervised_tasks",
+    "Активные задачи сценария под надзором",
+    lambda: len(supervisor),
+)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# модули проекта лежат в корне репозитория без пакета
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+# тесты работают на симуляторе без платы
+os.environ.setdefault("RPI_GPIO_BACKEND", "sim")
@@ -0,0 +1,104 @@
+import asyncio
+
+import metrics
+from clients import Client, COALESCE, DISCONNECT, DROP_OLDEST, EVENT, STATE
+
+
+class SlowSocket:
+    """Вебсокет, который отправляет сообщения только после release()."""
+
+    remote_address = ("127.0.0.1", 5000)
+
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+        self.released = asyncio.Event()
+
+    async def send(self, message):
+        await self.released.wait()
+        self.sent.append(message)
+
+    async def close(self, code, reason):
+        self.closed = (code, reason)
+
+    def release(self):
+        self.released.set()
+
+
+async def drain(client: Client):
+    client.websocket.release()
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_drop_oldest_keeps_newest():
+    dropped = metrics.CLIENT_DROPPED.get(DROP_OLDEST)
+
+    async def run():
+        client = Client(SlowSocket(), maxsize=4, policy=DROP_OLDEST)
+        for index in range(10):
+            client.put(f"e{index}")
+        await drain(client)
+        return client
+
+    client = asyncio.run(run())
+    assert client.websocket.sent == ["e6", "e7", "e8", "e9"]
+    assert client.stats() == {
+        "depth": 0, "max_depth": 4, "sent": 4, "dropped": 6, "coalesced": 0,
+    }
+    assert metrics.CLIENT_DROPPED.get(DROP_OLDEST) == dropped + 6
+
+
+def test_coalesce_drops_state_and_resyncs():
+    resynced = []
+
+    async def run():
+        client = Client(
+            SlowSocket(), resync=resynced.append, maxsize=4, policy=COALESCE
+        )
+        for message, kind in (
+            ("s0", STATE), ("e1", EVENT), ("s2", STATE), ("e3", EVENT),
+            ("e4", EVENT),
+        ):
+            client.put(message, kind)
+        assert client.stale
+        await drain(client)
+        return client
+
+    client = asyncio.run(run())
+    assert client.websocket.sent == ["e1", "e3", "e4"]
+    assert resynced == [client.websocket]
+    assert not client.stale
+    assert client.stats()["coalesced"] == 2
+    assert client.stats()["dropped"] == 0
+
+
+def test_coalesce_drops_oldest_event_without_state():
+    async def run():
+        client = Client(SlowSocket(), maxsize=2, policy=COALESCE)
+        for index in range(3):
+            client.put(f"e{index}")
+        await drain(client)
+        return client
+
+    client = asyncio.run(run())
+    assert client.websocket.sent == ["e1", "e2"]
+    assert client.stats()["dropped"] == 1
+
+
+def test_disconnect_closes_slow_client():
+    async def run():
+        client = Client(SlowSocket(), maxsize=2, policy=DISCONNECT)
+        for index in range(3):
+            client.put(f"e{index}")
+        await asyncio.sleep(0)
+        client.put("late")
+        await drain(client)
+        return client
+
+    client = asyncio.run(run())
+    assert client.websocket.closed == (1013, "slow consumer")
+    assert client.closing.done()
+    assert client.task.cancelled()
+    assert client.websocket.sent == []
+    assert client.stats()["depth"] == 0
@@ -0,0 +1,70 @@
+import pytest
+
+import config
+import exceptions
+from scenario import ANY_STATE, TRANSITIONS
+
+
+def write(tmp_path, text: str) -> str:
+    path = tmp_path / "panel.toml"
+    path.write_text(text)
+    return str(path)
+
+
+def test_defaults_without_file(tmp_path):
+    settings = config.load(str(tmp_path / "missing.toml"))
+    assert settings.buttons == config.DEFAULTS["buttons"]
+    assert settings.cancel_delay == 15.0
+    assert settings.transitions == TRANSITIONS
+
+
+def test_repo_file_matches_defaults():
+    settings = config.load(config.CONFIG_PATH)
+    assert settings.leds == config.DEFAULTS["leds"]
+    assert settings.transitions == TRANSITIONS
+
+
+def test_partial_file(tmp_path):
+    settings = config.load(write(tmp_path, """
+[timings]
+cancel_delay = 3
+
+[[transitions]]
+from = "*"
+event = "cancel"
+to = "idle"
+"""))
+    assert settings.cancel_delay == 3.0
+    assert settings.stable_time == 0.04
+    assert settings.transitions == {(ANY_STATE, "cancel"): "idle"}
+
+
+@pytest.mark.parametrize("text", [
+    "[buttons]\nready = 40",
+    "[buttons]\nbell = 5",
+    "[leds]\nready = 27",
+    "[timings]\ncancel_delay = -1",
+    "[timings]\nduty_cycle = 1",
+    "[timings]\nspeed = 2",
+    '[[transitions]]\nfrom = "idle"\nevent = "ready"\nto = "done"',
+    '[[transitions]]\nfrom = "idle"\nevent = "bell"\nto = "armed"',
+    '[[transitions]]\nfrom = "idle"',
+    "[buttons",
+    "buttons = 5",
+    'timings = "fast"',
+    "transitions = 1",
+    '[[transitions]]\nfrom = "idle"\nevent = ["ready"]\nto = "armed"',
+    "[leds]\nready = true",
+    "[timings]\ncancel_delay = true",
+])
+def test_invalid_file(tmp_path, text):
+    with pytest.raises(exceptions.ConfigError):
+        config.load(write(tmp_path, text))
+
+
+def test_reload_keeps_config_on_bad_section(tmp_path, monkeypatch):
+    path = write(tmp_path, "[timings]\ncancel_delay = 3")
+    monkeypatch.setattr(config, "current", config.load(path))
+    write(tmp_path, "buttons = 5")
+    assert config.reload() is None
+    assert config.current.cancel_delay == 3.0
@@ -0,0 +1,44 @@
+import pytest
+
+import db
+
+
+@pytest.fixture
+def journal(tmp_path):
+    db.database.init(str(tmp_path / "rpi.db"))
+    db.init_db(db.database, [db.Logs, db.LogsHourly])
+    yield db.database
+    db.database.close()
+
+
+def freelist(database) -> int:
+    return database.execute_sql("PRAGMA freelist_count").fetchone()[0]
+
+
+def test_compaction_reclaims_vacuum_pages(journal):
+    with journal.atomic():
+        db.Logs.insert_many(
+            [{"command": "ready pressed" + " " * 500}] * 5000
+        ).execute()
+    db.Logs.delete().execute()
+    before = freelist(journal)
+    assert before > 200
+    db.compact_logs(vacuum_pages=100)
+    assert freelist(journal) == before - 100
+
+
+def test_compaction_folds_old_rows(journal):
+    with journal.atomic():
+        db.Logs.insert_many([{"command": "wave pressed"}] * 30).execute()
+    assert db.compact_logs(max_rows=10) == 20
+    assert db.Logs.select().count() == 10
+    assert db.LogsHourly.get().count == 20
+
+
+def test_tail_starts_after_last_boundary(journal):
+    for command in (
+        "ready", "ready pressed", "cancel pressed", "ready", "ready pressed",
+    ):
+        db.Logs.create(command=command)
+    tail = db.logs_tail(("cancel pressed", "cancel", "timeout"))
+    assert [command for _, _, command in tail] == ["ready", "ready pressed"]
@@ -0,0 +1,49 @@
+import asyncio
+
+from deadlines import Deadlines
+
+
+def test_schedule_replaces_same_name():
+    timers = Deadlines()
+    first = timers.schedule("auto_off", 10, print)
+    second = timers.schedule("auto_off", 20, print)
+    assert first.cancelled
+    assert timers.get("auto_off") is second
+    assert list(timers.pending()) == ["auto_off"]
+
+
+def test_cancel_removes_deadline():
+    timers = Deadlines()
+    deadline = timers.schedule("auto_off", 10, print)
+    deadline.cancel()
+    assert deadline.done()
+    assert timers.pending() == {}
+    assert timers.remaining("auto_off") == 0.0
+
+
+def test_extend_moves_deadline():
+    timers = Deadlines()
+    deadline = timers.schedule("auto_off", 10, print)
+    deadline.extend(5)
+    assert 14 < deadline.remaining() <= 15
+    deadline.extend(-12)
+    assert 2 < timers.remaining("auto_off") <= 3
+
+
+def test_fires_in_order_and_skips_cancelled():
+    fired = []
+
+    async def run():
+        timers = Deadlines().attach(asyncio.get_running_loop())
+        timers.schedule("b", 0.02, fired.append, "b")
+        timers.schedule("a", 0.01, fired.append, "a")
+        timers.schedule("c", 0.01, fired.append, "c").cancel()
+        late = timers.schedule("d", 0.01, fired.append, "d")
+        late.extend(0.02)
+        await asyncio.sleep(0.1)
+        return timers
+
+    timers = asyncio.run(run())
+    assert fired == ["a", "b", "d"]
+    assert timers.pending() == {}
+    assert timers.stats() == {"pending": 0, "heap": 0}
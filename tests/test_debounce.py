@@ -0,0 +1,40 @@
+import hal
+from debounce import Debouncer, PRESS, RELEASE, LONG_PRESS
+
+PIN = 17
+
+
+def make():
+    pins = hal.SimulatedBackend()
+    pins.setup_input(PIN)
+    events = []
+    debouncer = Debouncer(
+        pins,
+        on_press=lambda pin: events.append(PRESS),
+        on_release=lambda pin: events.append(RELEASE),
+        on_long_press=lambda pin: events.append(LONG_PRESS),
+        stable_time=0.04,
+        long_press_time=1.0,
+    )
+    pins.add_event_detect(PIN, callback=debouncer.edge)
+    return pins, debouncer, events
+
+
+def test_bounces_give_one_press():
+    pins, debouncer, events = make()
+    pins.press(PIN, bounces=5, bounce_gap=0.001, hold=0.2)
+    assert events == [PRESS, RELEASE]
+    assert debouncer.stats() == {"edges": 12, "events": 2}
+
+
+def test_long_press():
+    pins, debouncer, events = make()
+    pins.press(PIN, bounces=2, hold=1.5)
+    assert events == [PRESS, LONG_PRESS]
+
+
+def test_presses_in_a_row():
+    pins, debouncer, events = make()
+    for _ in range(3):
+        pins.press(PIN, bounces=1, hold=0.1)
+    assert events == [PRESS, RELEASE] * 3
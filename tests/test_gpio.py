@@ -0,0 +1,148 @@
+import json
+import asyncio
+
+import pytest
+import websockets
+
+import protocol
+from clients import CLIENT_QUEUE_SIZE
+
+import gpio
+from deadlines import deadlines
+from panel import panel
+
+
+@pytest.fixture(autouse=True)
+def clean_deadlines():
+    yield
+    deadline = deadlines.get(gpio.AUTO_OFF)
+    if deadline is not None:
+        deadline.cancel()
+
+
+def test_snapshot_counts_down_auto_off(monkeypatch):
+    deadline = gpio.start_auto_off_timer()
+    gpio.publish_state()
+    published = panel.values["timeout"]
+    monkeypatch.setattr(deadline, "when", deadline.when - 4)
+    assert gpio.panel_snapshot()["timeout"] == published - 4
+    assert panel.values["timeout"] == published
+
+
+def test_snapshot_sent_with_remaining_time(monkeypatch):
+    sent = []
+    monkeypatch.setattr(
+        gpio, "send_state", lambda *args: sent.append(args)
+    )
+    deadline = gpio.start_auto_off_timer()
+    monkeypatch.setattr(deadline, "when", deadline.when - 4)
+    gpio.send_snapshot(None)
+    (opcode, version, values, connections), = sent
+    assert values["timeout"] == gpio.auto_off_remaining()
+    assert values["timeout"] < 15
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    messages = []
+    monkeypatch.setattr(
+        gpio.clients, "send",
+        lambda connections, message, kind=None: messages.append(message),
+    )
+    yield messages
+    gpio.commands.dispatch(gpio.commands.code("cancel"))
+
+
+def test_remote_commands_wait_for_recovery(sent):
+    gpio.recovered.clear()
+    source = object()
+    gpio.commands.dispatch(gpio.commands.code("ready"), source)
+    assert gpio.machine.state == "idle"
+    assert sent == ["ready command is unavailable now!"]
+    gpio.recover([])
+    gpio.commands.dispatch(gpio.commands.code("ready"), source)
+    assert gpio.machine.state == "armed"
+
+
+def test_bad_requests_keep_connection(monkeypatch):
+    def boom(websocket, message):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(gpio.REQUESTS, "boom", boom)
+
+    async def run():
+        async with websockets.serve(gpio.register, "localhost", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            async with websockets.connect(f"ws://localhost:{port}") as ws:
+                await ws.recv()
+                replies = []
+                for message in ("since", "extend", "resync", "boom:1"):
+                    await ws.send(message)
+                    replies.append(await asyncio.wait_for(ws.recv(), 1))
+                await asyncio.wait_for(await ws.ping(), 1)
+                return replies
+
+    since, extend, resync, boom = asyncio.run(run())
+    assert since == "Invalid since request"
+    assert extend == "extend command is unavailable now!"
+    assert json.loads(resync)["type"] == "snapshot"
+    assert boom == "Invalid request boom:1"
+
+
+def test_plain_buttons_keep_scenario_tasks(sent):
+    gpio.recover([])
+    gpio.commands.dispatch(gpio.commands.code("ready"), object())
+    for name in ("ready pressed", "accept pressed", "start pressed"):
+        gpio.commands.dispatch(gpio.commands.code(name))
+    assert gpio.machine.state == "started"
+    tasks = len(gpio.supervisor)
+    gpio.commands.dispatch(gpio.commands.code("wave pressed"))
+    gpio.commands.dispatch(gpio.commands.code("sim pressed"))
+    assert gpio.AUTO_OFF in deadlines.pending()
+    assert len(gpio.supervisor) == tasks
+
+
+def test_since_delivers_more_events_than_client_queue():
+    count = 5 * CLIENT_QUEUE_SIZE
+    first = protocol.last_seq
+
+    async def run():
+        async with websockets.serve(gpio.register, "localhost", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            async with websockets.connect(f"ws://localhost:{port}") as ws:
+                await ws.recv()
+                for _ in range(count):
+                    gpio.events.append(protocol.next_seq(), 1, 7, 1, 0)
+                await ws.send(f"since:{first}")
+                received = []
+                while True:
+                    message = json.loads(await asyncio.wait_for(ws.recv(), 1))
+                    if message["type"] == "since_end":
+                        return received, message
+                    received.append(message)
+
+    received, end = asyncio.run(run())
+    assert [message["type"] for message in received] == ["event"] * count
+    assert [message["seq"] for message in received] == list(
+        range(first + 1, first + count + 1)
+    )
+    assert end == {
+        "type": "since_end", "last": first + count, "boot": protocol.BOOT,
+    }
+
+
+def test_history_waits_for_storage(sent):
+    gpio.recovered.clear()
+    assert gpio.on_history(object(), "history:") is None
+    assert sent == ["history command is unavailable now!"]
+
+
+def test_command_table_matches_protocol():
+    table = {
+        command.name: code for code, command in gpio.commands.commands.items()
+    }
+    assert table == protocol.COMMAND_CODES
+    assert {
+        command.pin for command in gpio.commands.commands.values()
+        if command.pin is not None
+    } == set(gpio.config.current.buttons.values())
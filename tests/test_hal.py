@@ -0,0 +1,66 @@
+import sys
+import types
+
+import pytest
+
+import hal
+
+
+@pytest.fixture
+def no_board(monkeypatch):
+    """Модули rpi, lgpio и gpiozero установлены, но платы нет."""
+    rpi = types.ModuleType("RPi")
+    rpi_gpio = types.ModuleType("RPi.GPIO")
+
+    def setmode(mode):
+        raise RuntimeError("This module can only be run on a Raspberry Pi!")
+
+    rpi_gpio.setwarnings, rpi_gpio.setmode, rpi_gpio.BCM = print, setmode, 11
+    rpi.GPIO = rpi_gpio
+
+    lgpio = types.ModuleType("lgpio")
+    lgpio.error = type("error", (Exception,), {})
+
+    def gpiochip_open(chip):
+        raise lgpio.error("can not open gpiochip")
+
+    lgpio.gpiochip_open = gpiochip_open
+
+    gpiozero = types.ModuleType("gpiozero")
+    gpiozero.GPIOZeroError = type("GPIOZeroError", (Exception,), {})
+    gpiozero.BadPinFactory = type(
+        "BadPinFactory", (gpiozero.GPIOZeroError,), {}
+    )
+
+    class Device:
+        @staticmethod
+        def ensure_pin_factory():
+            raise gpiozero.BadPinFactory("Unable to load any default pin")
+
+    gpiozero.Device = Device
+    modules = {
+        "RPi": rpi, "RPi.GPIO": rpi_gpio, "lgpio": lgpio, "gpiozero": gpiozero,
+    }
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delenv(hal.BACKEND_ENV, raising=False)
+    monkeypatch.setattr(hal, "backend", None)
+
+
+def test_auto_selection_falls_back_to_sim(no_board):
+    assert hal.select_backend().name == "sim"
+
+
+def test_explicit_backend_is_unavailable(no_board):
+    with pytest.raises(RuntimeError):
+        hal.select_backend("lgpio")
+
+
+def test_sim_press_and_bouncetime():
+    pins = hal.SimulatedBackend()
+    pins.setup_input(4)
+    edges = []
+    pins.add_event_detect(4, callback=edges.append, bouncetime=10)
+    assert pins.press(4, bounces=2, bounce_gap=0.001, hold=0.1) == 2
+    assert pins.filtered == 4
+    assert edges == [4, 4]
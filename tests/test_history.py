@@ -0,0 +1,61 @@
+import json
+import asyncio
+
+import pytest
+
+import db
+import history
+from clients import clients
+
+
+class Socket:
+    remote_address = ("127.0.0.1", 5001)
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        await asyncio.sleep(0)
+        self.sent.append(message)
+
+
+@pytest.fixture
+def database(tmp_path):
+    db.database.init(str(tmp_path / "rpi.db"))
+    yield db.database
+    db.database.close()
+
+
+def request(message: str) -> list:
+    async def run():
+        socket = Socket()
+        clients.add(socket)
+        try:
+            await history.send_history(socket, message)
+            for _ in range(10):
+                await asyncio.sleep(0)
+        finally:
+            clients.remove(socket)
+        return socket.sent
+
+    return asyncio.run(run())
+
+
+def test_pages_go_through_client_queue(database):
+    db.init_db(database, [db.Logs, db.LogsHourly])
+    with database.atomic():
+        db.Logs.insert_many([{"command": "wave pressed"}] * 1200).execute()
+    sent = request("history:")
+    pages = [json.loads(message)["rows"] for message in sent[:-1]]
+    assert [len(rows) for rows in pages] == [500, 500, 200]
+    assert sent[-1] == '{"type":"history_end","last":1200}'
+
+
+def test_storage_error_is_reported(database):
+    (reply,) = request('history:{"command": "ready"}')
+    assert reply.startswith("History request failed: no such table")
+
+
+def test_invalid_request_is_reported(database):
+    (reply,) = request("history:{")
+    assert reply.startswith("Invalid history request")
@@ -0,0 +1,19 @@
+import json
+
+from hub import Hub
+
+
+def test_event_without_type_is_merged():
+    hub = Hub()
+    event = hub.accept("b1", json.dumps({"seq": 1, "text": "ready"}))
+    assert event["hub_seq"] == 1 and event["board"] == "b1"
+
+
+def test_snapshot_delta_and_duplicates():
+    hub = Hub()
+    hub.accept("b1", json.dumps({"seq": 1, "type": "snapshot", "leds": 0}))
+    hub.accept("b1", json.dumps({"seq": 2, "type": "delta", "version": 3,
+                                 "state": "armed"}))
+    assert hub.accept("b1", json.dumps({"seq": 2, "type": "delta"})) is None
+    assert hub.states == {"b1": {"leds": 0, "state": "armed"}}
+    assert (hub.merged, hub.duplicates) == (2, 1)
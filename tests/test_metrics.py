@@ -0,0 +1,21 @@
+import asyncio
+
+import metrics
+
+
+def test_busy_port_does_not_stop_the_server():
+    async def run():
+        first = await metrics.serve(port=0)
+        port = first.sockets[0].getsockname()[1]
+        second = await metrics.serve(port=port)
+        first.close()
+        return second
+
+    assert asyncio.run(run()) is None
+
+
+def test_port_from_environment(monkeypatch):
+    monkeypatch.setenv(metrics.METRICS_PORT_ENV, "9200")
+    assert metrics.metrics_port() == 9200
+    monkeypatch.delenv(metrics.METRICS_PORT_ENV)
+    assert metrics.metrics_port(9109) == 9109
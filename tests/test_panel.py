@@ -0,0 +1,26 @@
+from panel import PanelState
+
+
+def test_update_returns_only_changes():
+    panel = PanelState()
+    assert panel.update(state="armed", leds=0) == {"state": "armed"}
+    assert panel.update(state="armed") == {}
+    assert panel.version == 1
+
+
+def test_since_returns_deltas_after_version():
+    panel = PanelState()
+    panel.update(state="armed")
+    panel.update(leds=1)
+    panel.update(blink=2)
+    assert panel.since(3) == []
+    assert panel.since(1) == [(2, {"leds": 1}), (3, {"blink": 2})]
+
+
+def test_since_needs_snapshot_when_history_is_gone():
+    panel = PanelState(history=2)
+    for leds in range(1, 5):
+        panel.update(leds=leds)
+    assert panel.since(1) is None
+    assert panel.since(2) == [(3, {"leds": 3}), (4, {"leds": 4})]
+    assert panel.since(10) is None
@@ -0,0 +1,59 @@
+import pytest
+
+import protocol
+
+
+def test_frame_round_trip():
+    frame = protocol.encode(
+        protocol.OP_COMMAND, 42, command="start pressed", state="started",
+        leds=7,
+    )
+    assert len(frame) == protocol.FRAME_SIZE
+    assert protocol.decode(frame) == {
+        "opcode": protocol.OP_COMMAND,
+        "seq": 42,
+        "command": "start pressed",
+        "state": "started",
+        "leds": 7,
+        "buttons": 1 << 4,
+        "text": None,
+    }
+
+
+def test_error_frame_keeps_text():
+    frame = protocol.encode(protocol.OP_ERROR, 1, text="ошибка")
+    assert protocol.decode(frame)["text"] == "ошибка"
+
+
+def test_decode_rejects_bad_frames():
+    with pytest.raises(ValueError):
+        protocol.decode(b"\x02\x01")
+    frame = bytearray(protocol.encode(protocol.OP_COMMAND, 1))
+    frame[0] = 1
+    with pytest.raises(ValueError):
+        protocol.decode(bytes(frame))
+
+
+def test_state_round_trip():
+    values = {
+        "state": "ready", "leds": 1, "blink": 2, "buttons": 4, "timeout": 0,
+    }
+    snapshot = protocol.encode_state(protocol.OP_SNAPSHOT, 5, 3, values)
+    assert protocol.decode_state(snapshot)["values"] == values
+    delta = protocol.encode_state(
+        protocol.OP_DELTA, 6, 4, {"state": "idle", "timeout": 12}
+    )
+    assert protocol.decode_state(delta) == {
+        "opcode": protocol.OP_DELTA,
+        "seq": 6,
+        "version": 4,
+        "values": {"state": "idle", "timeout": 12},
+    }
+
+
+def test_negotiate():
+    assert protocol.negotiate("protocol:text") == protocol.TEXT
+    assert protocol.negotiate("protocol:binary:2") == protocol.BINARY
+    assert protocol.negotiate("ready") is None
+    with pytest.raises(ValueError):
+        protocol.negotiate("protocol:binary:1")
@@ -0,0 +1,62 @@
+from ring import EventRing
+
+
+def fill(ring: EventRing, count: int, start: int = 1):
+    for seq in range(start, start + count):
+        ring.append(seq, 1, 3, 2, 1)
+
+
+def test_since_returns_newer_events():
+    ring = EventRing(8)
+    fill(ring, 5)
+    gap, events = ring.since(2)
+    assert not gap
+    assert [event[0] for event in events] == [3, 4, 5]
+
+
+def test_since_last_seq_is_empty():
+    ring = EventRing(8)
+    fill(ring, 3)
+    assert ring.since(3) == (False, [])
+
+
+def test_since_reports_gap_after_eviction():
+    ring = EventRing(4)
+    fill(ring, 10)
+    assert ring.evicted_seq == 6
+    gap, events = ring.since(2)
+    assert gap
+    assert [event[0] for event in events] == [7, 8, 9, 10]
+
+
+def test_since_without_gap_at_eviction_boundary():
+    ring = EventRing(4)
+    fill(ring, 10)
+    gap, events = ring.since(6)
+    assert not gap
+    assert [event[0] for event in events] == [7, 8, 9, 10]
+
+
+def test_event_fields_and_text():
+    ring = EventRing(2)
+    ring.append(1, 2, 4, 3, 7, "accept pressed command is unavailable now!")
+    (event,) = ring.since(0)[1]
+    seq, at, opcode, command, state, leds, text = event
+    assert (seq, opcode, command, state, leds) == (1, 2, 4, 3, 7)
+    assert text.endswith("unavailable now!")
+    assert ring.nbytes() == 2 * 16
+
+
+def test_seq_from_before_restart_is_a_gap():
+    ring = EventRing(8)
+    fill(ring, 3)
+    assert ring.since(500) == (True, [])
+    assert EventRing(8).since(1) == (True, [])
+    assert EventRing(8).since(0) == (False, [])
+
+
+def test_latest_covers_messages_not_in_ring():
+    ring = EventRing(8)
+    fill(ring, 3)
+    assert ring.since(5, latest=5) == (False, [])
+    assert ring.since(6, latest=5) == (True, [])
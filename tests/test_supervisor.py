@@ -0,0 +1,75 @@
+import time
+import threading
+
+import metrics
+from supervisor import Supervisor
+
+
+class Handle:
+    """Дескриптор задачи, которая завершается по cancel или никогда."""
+
+    def __init__(self, stops: bool = True):
+        self.stops = stops
+        self.stopped = False
+
+    def cancel(self):
+        self.stopped = self.stops
+
+    def done(self) -> bool:
+        return self.stopped
+
+
+def test_cancel_reaps_graceful_handles():
+    supervisor = Supervisor(grace=0.05)
+    handles = [supervisor.spawn(Handle).handle for _ in range(3)]
+    assert len(supervisor) == 3
+    supervisor.cancel()
+    assert all(handle.stopped for handle in handles)
+    assert supervisor.stats() == {
+        "active": 0, "cancelling": 0, "spawned": 3, "reaped": 3, "leaked": 0,
+    }
+
+
+def test_finished_handles_leave_active_list():
+    supervisor = Supervisor()
+    finished = supervisor.spawn(Handle)
+    supervisor.spawn(Handle)
+    finished.handle.stopped = True
+    supervisor.reap()
+    assert len(supervisor) == 1
+    assert supervisor.spawn(lambda: None) is None
+
+
+def test_stuck_handle_leaks_after_grace():
+    leaked = metrics.TASKS_LEAKED.get()
+    supervisor = Supervisor(grace=0.05)
+    supervisor.spawn(Handle, stops=False)
+    supervisor.spawn(Handle)
+    supervisor.cancel()
+    assert supervisor.stats()["cancelling"] == 1
+    assert supervisor.reap() == 0
+    time.sleep(0.06)
+    assert supervisor.reap() == 1
+    assert supervisor.stats() == {
+        "active": 0, "cancelling": 0, "spawned": 2, "reaped": 1, "leaked": 1,
+    }
+    assert metrics.TASKS_LEAKED.get() == leaked + 1
+
+
+def test_cancel_joins_threads():
+    supervisor = Supervisor(grace=1.0)
+    stop = threading.Event()
+
+    class Worker(threading.Thread):
+        def cancel(self):
+            stop.set()
+
+    def start():
+        worker = Worker(target=stop.wait, daemon=True)
+        worker.start()
+        return worker
+
+    worker = supervisor.spawn(start).handle
+    supervisor.cancel()
+    assert not worker.is_alive()
+    assert supervisor.stats()["reaped"] == 1